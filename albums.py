@@ -0,0 +1,62 @@
+from typing import List, Optional
+
+from records import MessageRecord
+
+# Telegram accepts between 2 and 10 items per send_media_group call
+MAX_ALBUM_SIZE = 10
+
+# Photos and videos may share an album, documents only go with documents
+ALBUM_KINDS = {
+    'photo': 'visual',
+    'video': 'visual',
+    'document': 'document'
+}
+
+
+def _album_kind(msg: MessageRecord) -> Optional[str]:
+    return ALBUM_KINDS.get(msg.type)
+
+
+def _group_size(messages: List[MessageRecord], start: int) -> int:
+    """Number of consecutive messages from `start` sharing one media group"""
+    group_id = messages[start].media_group_id
+    if group_id is None:
+        return 1
+    end = start + 1
+    while end < len(messages) and messages[end].media_group_id == group_id:
+        end += 1
+    return end - start
+
+
+def plan_batches(messages: List[MessageRecord]) -> List[List[MessageRecord]]:
+    """Split messages into send units, packing media runs into albums.
+
+    Consecutive photos/videos (or consecutive documents) are packed into
+    units of up to MAX_ALBUM_SIZE items; everything else is sent alone.
+    An original media group is never split across two albums.
+    """
+    batches: List[List[MessageRecord]] = []
+    current: List[MessageRecord] = []
+    index = 0
+
+    while index < len(messages):
+        kind = _album_kind(messages[index])
+        if kind is None:
+            if current:
+                batches.append(current)
+                current = []
+            batches.append([messages[index]])
+            index += 1
+            continue
+
+        size = _group_size(messages, index)
+        if current and (_album_kind(current[0]) != kind or len(current) + size > MAX_ALBUM_SIZE):
+            batches.append(current)
+            current = []
+
+        current.extend(messages[index:index + size])
+        index += size
+
+    if current:
+        batches.append(current)
+    return batches
@@ -0,0 +1,177 @@
+"""Offline benchmark of the forwarding pipeline against FakeBot.
+
+Example:
+    python benchmark.py --messages 200 --groups 30 --topics 3 --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200, help="messages per batch (N)")
+    parser.add_argument("--groups", type=int, default=30, help="destination groups (M)")
+    parser.add_argument("--topics", type=int, default=0, help="forum topics per group (K)")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per fake API call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of sends failing transiently")
+    parser.add_argument("--retry-after-rate", type=float, default=0.0, help="share of sends answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="RetryAfter seconds when injected")
+    parser.add_argument("--global-rate", type=float, default=1000, help="GLOBAL_RATE_LIMIT override")
+    parser.add_argument("--chat-rate", type=float, default=60000, help="CHAT_RATE_LIMIT override")
+    parser.add_argument("--concurrency", type=int, default=None, help="FORWARD_CONCURRENCY override")
+    parser.add_argument("--senders", type=int, default=0, help="extra sender bots next to the primary")
+    parser.add_argument("--text-only", action="store_true", help="send only text messages")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the results as one JSON object")
+    return parser.parse_args()
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[int(q) - 1]
+
+
+def synthetic_batch(count: int, text_only: bool = False) -> list:
+    """Records cycling through the message types handle_message produces"""
+    from records import MessageRecord
+
+    types = ['text'] if text_only else ['text', 'photo', 'photo', 'video', 'document']
+    batch = []
+    for index in range(count):
+        msg_type = types[index % len(types)]
+        if msg_type == 'text':
+            batch.append(MessageRecord('text', text=f"Message {index}"))
+        else:
+            batch.append(MessageRecord(
+                msg_type,
+                file_id=f"file-{index}",
+                file_unique_id=f"unique-{index}",
+                caption=f"Caption {index}"
+            ))
+    return batch
+
+
+async def run(args: argparse.Namespace) -> dict:
+    # main reads its configuration at import time
+    import main
+    from config import Config
+    from fakebot import FakeBot, fake_callback_update, fake_context, seed_topics
+    from ratelimit import RateLimiter
+    from senders import Sender
+
+    def fake_bot(bot_id: int) -> FakeBot:
+        return FakeBot(
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            retry_after_rate=args.retry_after_rate,
+            retry_after=args.retry_after,
+            topics_per_group=args.topics,
+            bot_id=bot_id,
+            seed=args.seed + bot_id
+        )
+
+    bot = fake_bot(1)
+    main.extra_senders[:] = [
+        Sender(
+            fake_bot(index + 2),
+            RateLimiter(Config.GLOBAL_RATE_LIMIT, Config.CHAT_RATE_LIMIT, Config.CHAT_BURST),
+            f"fake-{index + 2}"
+        )
+        for index in range(args.senders)
+    ]
+    bots = [bot] + [sender.bot for sender in main.extra_senders]
+    user_id = Config.AUTHORIZED_USER_ID
+    context = fake_context(bot)
+    Config.GROUP_IDS = [-1000000000000 - index for index in range(args.groups)]
+
+    timings = {}
+    started = time.perf_counter()
+    session = main.sessions.get(user_id)
+    session.groups_info = await main.fetch_groups_info(context)
+    timings['fetch_groups_info'] = time.perf_counter() - started
+    seed_topics(main.metadata_cache, list(session.groups_info), args.topics)
+
+    session.messages_to_forward = synthetic_batch(args.messages, args.text_only)
+    session.selected_groups = set(session.groups_info)
+
+    started = time.perf_counter()
+    # Without topics confirm_send goes straight on to forward_messages
+    await main.confirm_send(fake_callback_update("confirm_send", user_id), context)
+    timings['confirm_send'] = time.perf_counter() - started
+    if args.topics:
+        await main.forward_messages(fake_callback_update("forward_messages", user_id), context)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(job.task for job in main.job_registry.running()), return_exceptions=True)
+    timings['forward_messages'] = time.perf_counter() - started
+
+    latencies = [latency for fake in bots for latency in fake.send_latencies()]
+    destinations = args.groups * max(args.topics, 1)
+    delivered = sum(
+        len(call['media']) if call['method'] == 'send_media_group' else 1
+        for fake in bots for call in fake.sent
+    )
+    return {
+        'messages': args.messages,
+        'groups': args.groups,
+        'topics': args.topics,
+        'senders': len(bots),
+        'destinations': destinations,
+        'delivered': delivered,
+        'api_calls': len(latencies),
+        'timings': timings,
+        'throughput': delivered / timings['forward_messages'] if timings['forward_messages'] else 0.0,
+        'latency_p50': percentile(latencies, 50),
+        'latency_p99': percentile(latencies, 99)
+    }
+
+
+def main() -> None:
+    args = parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="forward-bench-")
+    os.environ.update({
+        'AUTHORIZED_USER_ID': os.getenv('AUTHORIZED_USER_ID') or '1',
+        'OUTBOX_PATH': os.path.join(workdir, 'outbox.db'),
+        'METADATA_CACHE_PATH': os.path.join(workdir, 'metadata_cache.json'),
+        'GLOBAL_RATE_LIMIT': str(args.global_rate),
+        'CHAT_RATE_LIMIT': str(args.chat_rate),
+        'CHAT_BURST': str(max(int(args.chat_rate / 60), 1))
+    })
+    if args.concurrency is not None:
+        os.environ['FORWARD_CONCURRENCY'] = str(args.concurrency)
+
+    tracemalloc.start()
+    results = asyncio.run(run(args))
+    results['peak_memory_mb'] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+
+    if args.json:
+        print(json.dumps(results))
+        return
+
+    print(f"Batch: {results['messages']} messages x {results['groups']} groups x "
+          f"{max(results['topics'], 1)} topics = {results['destinations']} destinations")
+    for name, seconds in results['timings'].items():
+        print(f"  {name:<18} {seconds:8.3f}s")
+    print(f"  delivered          {results['delivered']} items in {results['api_calls']} send calls "
+          f"over {results['senders']} bot(s)")
+    print(f"  throughput         {results['throughput']:8.1f} items/s")
+    print(f"  send latency p50   {results['latency_p50'] * 1000:8.1f} ms")
+    print(f"  send latency p99   {results['latency_p99'] * 1000:8.1f} ms")
+    print(f"  peak memory        {results['peak_memory_mb']:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,39 @@
 import os
 
+
+def _get_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except (ValueError, TypeError):
+        return default
+
+
+def _get_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except (ValueError, TypeError):
+        return default
+
+
 class Config:
     TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
+    # Extra bot tokens, comma separated, that share the sending of text messages.
+    # Each sender bot must be a member of the destination groups
+    SENDER_TOKENS = [token.strip() for token in os.getenv("SENDER_TOKENS", "").split(",") if token.strip()]
     try:
         AUTHORIZED_USER_ID = int(os.getenv("AUTHORIZED_USER_ID", "0"))
     except (ValueError, TypeError):
         AUTHORIZED_USER_ID = 0
-    
+
+    # Further operators, comma separated, next to AUTHORIZED_USER_ID
+    AUTHORIZED_USER_IDS = {AUTHORIZED_USER_ID} if AUTHORIZED_USER_ID else set()
+    user_ids_str = os.getenv("AUTHORIZED_USER_IDS", "")
+    if user_ids_str:
+        try:
+            AUTHORIZED_USER_IDS |= {int(uid.strip()) for uid in user_ids_str.split(",") if uid.strip()}
+        except ValueError:
+            pass
+
     # Parse group IDs from environment variable
     GROUP_IDS = []
     group_ids_str = os.getenv("GROUP_IDS", "")
@@ -15,3 +42,105 @@ class Config:
             GROUP_IDS = [int(gid.strip()) for gid in group_ids_str.split(",")]
         except ValueError:
             GROUP_IDS = []
+
+    # Channel sync: new posts of SYNC_SOURCE_CHAT_ID (0 disables it) are mirrored to
+    # SYNC_DESTINATIONS, comma separated "group_id" or "group_id:topic_id" (default:
+    # the general chat of every group). Posts arriving less than SYNC_DEBOUNCE seconds
+    # apart are sent as one batch, held at most SYNC_MAX_WAIT seconds
+    SYNC_SOURCE_CHAT_ID = _get_int("SYNC_SOURCE_CHAT_ID", 0)
+    try:
+        SYNC_DESTINATIONS = [
+            (int(group_id), int(topic_id) if topic_id else None)
+            for group_id, _, topic_id in (
+                item.strip().partition(":") for item in os.getenv("SYNC_DESTINATIONS", "").split(",") if item.strip()
+            )
+        ] or [(group_id, None) for group_id in GROUP_IDS]
+    except ValueError:
+        SYNC_DESTINATIONS = []
+    SYNC_DEBOUNCE = _get_float("SYNC_DEBOUNCE", 3.0)
+    SYNC_MAX_WAIT = _get_float("SYNC_MAX_WAIT", 15.0)
+
+    # Fan-out tuning: destinations sent to in parallel, and Telegram's
+    # global (messages/second) and per-chat (messages/minute) rate limits
+    FORWARD_CONCURRENCY = _get_int("FORWARD_CONCURRENCY", 8)
+    GLOBAL_RATE_LIMIT = _get_float("GLOBAL_RATE_LIMIT", 30)
+    CHAT_RATE_LIMIT = _get_float("CHAT_RATE_LIMIT", 20)
+    CHAT_BURST = _get_int("CHAT_BURST", 3)
+
+    # Retries for flood waits (RetryAfter) and transient network errors
+    SEND_MAX_RETRIES = _get_int("SEND_MAX_RETRIES", 5)
+    RETRY_BASE_DELAY = _get_float("RETRY_BASE_DELAY", 1.0)
+    RETRY_MAX_DELAY = _get_float("RETRY_MAX_DELAY", 60.0)
+
+    # SQLite outbox that lets interrupted forwarding jobs resume
+    OUTBOX_PATH = os.getenv("OUTBOX_PATH", "outbox.db")
+
+    # Skip content already delivered to a destination (can be overridden per job),
+    # how long deliveries are remembered and finished jobs kept (seconds, 0 = forever),
+    # and how often the outbox is compacted
+    SKIP_DUPLICATES = os.getenv("SKIP_DUPLICATES", "1").lower() not in ("0", "false", "no")
+    DELIVERED_TTL = _get_float("DELIVERED_TTL", 30 * 86400)
+    JOB_RETENTION = _get_float("JOB_RETENTION", 7 * 86400)
+    COMPACT_INTERVAL = _get_float("COMPACT_INTERVAL", 86400)
+
+    # Group/topic metadata cache: file, freshness (seconds) and parallel lookups
+    METADATA_CACHE_PATH = os.getenv("METADATA_CACHE_PATH", "metadata_cache.json")
+    METADATA_TTL = _get_float("METADATA_TTL", 600)
+    METADATA_CONCURRENCY = _get_int("METADATA_CONCURRENCY", 10)
+
+    # Bot API connections: sends get a pool sized for the fan-out, long polling
+    # its own connection. Timeouts in seconds, HTTP_VERSION "1.1" or "2"
+    HTTP_POOL_SIZE = _get_int("HTTP_POOL_SIZE", max(FORWARD_CONCURRENCY, METADATA_CONCURRENCY) + 4)
+    HTTP_KEEPALIVE = _get_float("HTTP_KEEPALIVE", 60)
+    HTTP_CONNECT_TIMEOUT = _get_float("HTTP_CONNECT_TIMEOUT", 5)
+    HTTP_READ_TIMEOUT = _get_float("HTTP_READ_TIMEOUT", 10)
+    HTTP_WRITE_TIMEOUT = _get_float("HTTP_WRITE_TIMEOUT", 20)
+    HTTP_POOL_TIMEOUT = _get_float("HTTP_POOL_TIMEOUT", 10)
+    HTTP_VERSION = os.getenv("HTTP_VERSION", "1.1")
+
+    # Minimum seconds between edits of a job's live progress message
+    PROGRESS_INTERVAL = _get_float("PROGRESS_INTERVAL", 5)
+
+    # Groups/topics shown per page of the selection keyboards
+    KEYBOARD_PAGE_SIZE = _get_int("KEYBOARD_PAGE_SIZE", 10)
+
+    # Local Prometheus-style /metrics endpoint, disabled while the port is 0
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT = _get_int("METRICS_PORT", 0)
+
+    # Per-operator sessions: idle lifetime (seconds) and how many are kept
+    SESSION_TTL = _get_float("SESSION_TTL", 3600)
+    MAX_SESSIONS = _get_int("MAX_SESSIONS", 100)
+
+    # Received messages are batched until none arrived for INGEST_DEBOUNCE
+    # seconds, but never held longer than INGEST_MAX_WAIT seconds
+    INGEST_DEBOUNCE = _get_float("INGEST_DEBOUNCE", 1.0)
+    INGEST_MAX_WAIT = _get_float("INGEST_MAX_WAIT", 5.0)
+
+    # Local directory uploads: /upload only reads below UPLOAD_ROOT (unset disables it).
+    # Files are uploaded once to STAGING_CHAT_ID (default: the operator's chat)
+    UPLOAD_ROOT = os.getenv("UPLOAD_ROOT", "")
+    STAGING_CHAT_ID = _get_int("STAGING_CHAT_ID", 0)
+    UPLOAD_CONCURRENCY = _get_int("UPLOAD_CONCURRENCY", 3)
+    UPLOAD_TIMEOUT = _get_float("UPLOAD_TIMEOUT", 120)
+
+    # Update delivery: "polling" or "webhook". Behind a TLS-terminating proxy
+    # leave WEBHOOK_CERT/WEBHOOK_KEY empty and set WEBHOOK_URL to the public URL.
+    # WEBHOOK_SECRET is required in webhook mode
+    UPDATE_MODE = os.getenv("UPDATE_MODE", "polling").lower()
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+    WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+    WEBHOOK_PORT = _get_int("WEBHOOK_PORT", 8443)
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_CERT = os.getenv("WEBHOOK_CERT", "")
+    WEBHOOK_KEY = os.getenv("WEBHOOK_KEY", "")
+    WEBHOOK_MAX_CONNECTIONS = _get_int("WEBHOOK_MAX_CONNECTIONS", 40)
+    CONCURRENT_UPDATES = _get_int("CONCURRENT_UPDATES", 8)
+    # Seconds running jobs get to finish on shutdown before being resumed later
+    DRAIN_TIMEOUT = _get_float("DRAIN_TIMEOUT", 30)
+
+    # Scheduled jobs of at least SCHEDULE_LARGE_JOB deliveries start one after
+    # another as the send budget frees up, but at most SCHEDULE_MAX_DELAY seconds late
+    SCHEDULE_LARGE_JOB = _get_int("SCHEDULE_LARGE_JOB", 200)
+    SCHEDULE_MAX_DELAY = _get_float("SCHEDULE_MAX_DELAY", 3600)
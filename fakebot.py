@@ -0,0 +1,197 @@
+"""In-process stand-in for the Telegram Bot API.
+
+FakeBot answers the Bot methods used by main.py after a configurable
+latency, and can inject network errors and RetryAfter flood waits. Every
+call is timed so benchmarks can report per-send latency without ever
+talking to Telegram.
+
+The update injector helpers feed raw Bot API updates into a real
+Application, either straight into its update queue (as polling does) or
+through the local webhook server, so both serving modes can be exercised
+offline.
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from telegram import Update
+from telegram.error import NetworkError, RetryAfter, TimedOut
+
+SEND_METHODS = (
+    'send_message', 'send_photo', 'send_video', 'send_document', 'send_media_group', 'copy_message'
+)
+
+
+class FakeBot:
+    """Bot replacement with injectable latency, errors and flood waits"""
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, error_rate: float = 0.0,
+                 retry_after_rate: float = 0.0, retry_after: int = 1, topics_per_group: int = 0,
+                 bot_id: int = 1, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after_rate = retry_after_rate
+        self.retry_after = retry_after
+        self.topics_per_group = topics_per_group
+        self.id = bot_id
+        self.random = random.Random(seed)
+        self.message_ids = itertools.count(1)
+        self.file_numbers = itertools.count(1)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.sent: List[Dict] = []
+
+    async def _call(self, method: str, can_fail: bool = True) -> None:
+        started = time.perf_counter()
+        self.calls[method] += 1
+        try:
+            await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+            if can_fail:
+                roll = self.random.random()
+                if roll < self.retry_after_rate:
+                    raise RetryAfter(self.retry_after)
+                if roll < self.retry_after_rate + self.error_rate:
+                    raise self.random.choice([TimedOut(), NetworkError("Connection reset")])
+        finally:
+            self.latencies[method].append(time.perf_counter() - started)
+
+    def _message(self, chat_id: int, **kwargs) -> SimpleNamespace:
+        fields = dict(
+            text=None, caption=None, entities=None, caption_entities=None, media_group_id=None,
+            photo=None, video=None, document=None
+        )
+        fields.update(kwargs)
+        return SimpleNamespace(message_id=next(self.message_ids), chat_id=chat_id, **fields)
+
+    def _file(self, content) -> SimpleNamespace:
+        """File of a sent message: the given file_id, or a new one for uploaded bytes"""
+        number = next(self.file_numbers)
+        file_id = content if isinstance(content, str) else f"fake-file-{self.id}-{number}"
+        return SimpleNamespace(file_id=file_id, file_unique_id=f"fake-unique-{file_id}")
+
+    async def _send(self, method: str, chat_id: int, message: Optional[Dict] = None, **kwargs) -> SimpleNamespace:
+        await self._call(method)
+        self.sent.append(dict(kwargs, method=method, chat_id=chat_id))
+        return self._message(chat_id, **(message or {}))
+
+    async def send_message(self, chat_id: int, text: str = None, **kwargs):
+        return await self._send('send_message', chat_id, {'text': text}, text=text, **kwargs)
+
+    async def send_photo(self, chat_id: int, photo=None, **kwargs):
+        message = {'photo': [self._file(photo)], 'caption': kwargs.get('caption')}
+        return await self._send('send_photo', chat_id, message, photo=photo, **kwargs)
+
+    async def send_video(self, chat_id: int, video=None, **kwargs):
+        message = {'video': self._file(video), 'caption': kwargs.get('caption')}
+        return await self._send('send_video', chat_id, message, video=video, **kwargs)
+
+    async def send_document(self, chat_id: int, document=None, **kwargs):
+        message = {'document': self._file(document), 'caption': kwargs.get('caption')}
+        return await self._send('send_document', chat_id, message, document=document, **kwargs)
+
+    async def send_media_group(self, chat_id: int, media=(), **kwargs):
+        await self._send('send_media_group', chat_id, media=list(media), **kwargs)
+        return [self._message(chat_id) for _ in media]
+
+    async def copy_message(self, chat_id: int, from_chat_id: int = None, message_id: int = None, **kwargs):
+        return await self._send(
+            'copy_message', chat_id, from_chat_id=from_chat_id, message_id=message_id, **kwargs
+        )
+
+    async def edit_message_text(self, text: str = None, chat_id: int = None, message_id: int = None, **kwargs):
+        await self._call('edit_message_text', can_fail=False)
+        return self._message(chat_id, text=text)
+
+    async def get_chat(self, chat_id: int):
+        await self._call('get_chat', can_fail=False)
+        return SimpleNamespace(id=chat_id, title=f"Group {abs(chat_id)}", is_forum=self.topics_per_group > 0)
+
+    async def get_chat_member(self, chat_id: int, user_id: int):
+        await self._call('get_chat_member', can_fail=False)
+        return SimpleNamespace(status='administrator', user=SimpleNamespace(id=user_id))
+
+    def send_latencies(self) -> List[float]:
+        return [latency for method in SEND_METHODS for latency in self.latencies[method]]
+
+
+class FakeCallbackQuery:
+    """Callback query whose answers and edits are simply accepted"""
+
+    def __init__(self, data: str, chat_id: int):
+        self.data = data
+        self.message = SimpleNamespace(message_id=0, chat_id=chat_id)
+
+    async def answer(self, *args, **kwargs) -> None:
+        pass
+
+    async def edit_message_text(self, text: str, **kwargs):
+        return self.message
+
+    async def edit_message_reply_markup(self, *args, **kwargs):
+        return self.message
+
+
+def fake_callback_update(data: str, user_id: int) -> SimpleNamespace:
+    """Update carrying a button press by `user_id` in its private chat"""
+    return SimpleNamespace(
+        callback_query=FakeCallbackQuery(data, user_id),
+        effective_user=SimpleNamespace(id=user_id, full_name="Benchmark"),
+        effective_chat=SimpleNamespace(id=user_id),
+        message=None
+    )
+
+
+def seed_topics(metadata_cache, group_ids: List[int], topics_per_group: int) -> None:
+    """Teach the cache forum topics the way the bot learns them, from topic created messages"""
+    for group_id in group_ids:
+        for thread_id in range(1, topics_per_group + 1):
+            metadata_cache.update_topic(group_id, thread_id, name=f"Topic {thread_id}")
+
+
+def fake_context(bot: FakeBot, args: Optional[List[str]] = None) -> SimpleNamespace:
+    return SimpleNamespace(bot=bot, args=args or [])
+
+
+def text_update(text: str, user_id: int, update_id: int = 1, message_id: int = 1) -> Dict:
+    """Raw Bot API update of a private text message, as Telegram would send it"""
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': "Injector"},
+            'text': text
+        }
+    }
+
+
+async def inject_update(application, data: Dict) -> None:
+    """Queue a raw update the way the polling updater does"""
+    await application.update_queue.put(Update.de_json(data, application.bot))
+
+
+async def post_update(url: str, data: Dict, secret_token: str = "") -> int:
+    """POST a raw update to a local webhook server and return the HTTP status"""
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    body = json.dumps(data).encode()
+    writer.write(
+        f"POST {parts.path or '/'} HTTP/1.1\r\n"
+        f"Host: {parts.netloc}\r\n"
+        "Content-Type: application/json\r\n"
+        f"X-Telegram-Bot-Api-Secret-Token: {secret_token}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    writer.close()
+    return int(status_line.split()[1])
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from telegram.error import RetryAfter
+
+from records import MessageRecord
+from retry import RetryPolicy, is_destination_error
+from senders import SenderPool
+
+logger = logging.getLogger(__name__)
+
+Destination = Tuple[int, Optional[int]]
+# Sends one unit with the given bot to a chat and optional topic
+SendFunc = Callable[[object, int, Optional[int], List[MessageRecord]], Awaitable[None]]
+# Called after each unit settles with the error that failed it, if any
+UnitCallback = Callable[[Destination, List[MessageRecord], Optional[Exception]], None]
+# Called before each retry with the error and the seconds it will wait
+RetryCallback = Callable[[Destination, Exception, float], None]
+# Called when a destination turned out unreachable, with the units it will not be sent
+DeadCallback = Callable[[Destination, List[List[MessageRecord]], Exception], None]
+
+
+class DestinationResult:
+    """Delivery counters for one (group, topic) destination"""
+
+    def __init__(self, group_id: int, topic_id: Optional[int]):
+        self.group_id = group_id
+        self.topic_id = topic_id
+        self.success = 0
+        self.failed = 0
+        self.retries = 0
+        self.wait_time = 0.0
+        # Why the rest of the batch was given up on, if it was
+        self.dead_reason: Optional[str] = None
+
+
+def interleave_by_chat(destinations: List[Destination]) -> List[Destination]:
+    """Order destinations round-robin across chats.
+
+    Topics of the same group share one per-chat budget, so starting them
+    back to back would just have them queue on each other's rate limit.
+    """
+    by_chat: Dict[int, List[Destination]] = {}
+    for destination in destinations:
+        by_chat.setdefault(destination[0], []).append(destination)
+
+    ordered = []
+    queues = list(by_chat.values())
+    while queues:
+        ordered.extend(queue.pop(0) for queue in queues)
+        queues = [queue for queue in queues if queue]
+    return ordered
+
+
+class FanOutEngine:
+    """Sends one batch of messages to many destinations concurrently.
+
+    Every destination comes with its own list of send units (a single
+    message or an album), so a resumed job only sends what is still
+    pending. Each destination is worked by its own task that sends its
+    units in order, so ordering is kept per destination while up to `concurrency`
+    destinations progress in parallel under the rate limits of the pool's tokens.
+    A failure showing that the destination itself is unreachable (no rights,
+    closed topic...) gives up on its remaining units instead of failing each;
+    from an extra token it only rules out that token there.
+    """
+
+    def __init__(self, send: SendFunc, pool: SenderPool, concurrency: int,
+                 retry_policy: RetryPolicy, on_unit_done: Optional[UnitCallback] = None,
+                 on_retry: Optional[RetryCallback] = None, on_dead: Optional[DeadCallback] = None):
+        self.send = send
+        self.pool = pool
+        self.concurrency = max(concurrency, 1)
+        self.retry_policy = retry_policy
+        self.on_unit_done = on_unit_done
+        self.on_retry = on_retry
+        self.on_dead = on_dead
+
+    async def run(self, plan: Dict[Destination, List[List[MessageRecord]]]) -> List[DestinationResult]:
+        """Deliver each destination's units, results in plan order"""
+        results = {dest: DestinationResult(*dest) for dest in plan}
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        await asyncio.gather(*(
+            self._deliver(results[dest], plan[dest], semaphore)
+            for dest in interleave_by_chat(list(results))
+        ))
+        return list(results.values())
+
+    async def _deliver(self, result: DestinationResult, units: List[List[MessageRecord]],
+                       semaphore: asyncio.Semaphore) -> None:
+        await semaphore.acquire()
+        try:
+            for index, unit in enumerate(units):
+                error = await self._send_with_retry(result, unit, semaphore)
+                if error is not None and is_destination_error(error):
+                    self._give_up(result, units[index + 1:], error)
+                    break
+        finally:
+            semaphore.release()
+
+    def _give_up(self, result: DestinationResult, remaining: List[List[MessageRecord]], error: Exception) -> None:
+        result.dead_reason = str(error)
+        skipped = sum(len(unit) for unit in remaining)
+        logger.warning(
+            f"Destination {result.group_id}/{result.topic_id} is unreachable, "
+            f"skipping its {skipped} remaining messages: {error}"
+        )
+        if self.on_dead:
+            self.on_dead((result.group_id, result.topic_id), remaining, error)
+
+    async def _send_with_retry(self, result: DestinationResult, unit: List[MessageRecord],
+                               semaphore: asyncio.Semaphore) -> Optional[Exception]:
+        """Send a unit, retrying transient errors; returns the error that failed it"""
+        attempt = 0
+        while True:
+            sender = self.pool.pick(result.group_id, unit)
+            # Every album item counts against the rate limits
+            await sender.limiter.acquire(result.group_id, len(unit))
+            try:
+                await self.send(sender.bot, result.group_id, result.topic_id, unit)
+                result.success += len(unit)
+                self._unit_done(result, unit, None)
+                return None
+            except Exception as e:
+                if is_destination_error(e) and sender is not self.pool.primary:
+                    # Only says this token cannot post here; the primary decides
+                    self.pool.report_forbidden(sender, result.group_id)
+                    logger.warning(
+                        f"Sender {sender.name} cannot post to {result.group_id}, "
+                        f"leaving it to the other tokens: {e}"
+                    )
+                    result.retries += 1
+                    continue
+
+                attempt += 1
+                delay = self.retry_policy.delay_for(e, attempt)
+                if delay is None:
+                    result.failed += len(unit)
+                    logger.error(f"Forwarding failed to {result.group_id}/{result.topic_id}: {e}")
+                    self._unit_done(result, unit, e)
+                    return e
+
+                if isinstance(e, RetryAfter):
+                    # Other topics of this chat are throttled as well
+                    self.pool.report_flood(sender, result.group_id, delay)
+                    if not self.pool.pick(result.group_id, unit).is_flooded(result.group_id):
+                        # Another token takes over right away
+                        delay = 0.0
+                logger.warning(
+                    f"Retrying {result.group_id}/{result.topic_id} in {delay:.1f}s "
+                    f"(attempt {attempt}): {e}"
+                )
+                if self.on_retry:
+                    self.on_retry((result.group_id, result.topic_id), e, delay)
+
+            result.retries += 1
+            result.wait_time += delay
+
+            # Park only this destination and give its slot to the others meanwhile
+            semaphore.release()
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                await semaphore.acquire()
+
+    def _unit_done(self, result: DestinationResult, unit: List[MessageRecord], error: Optional[Exception]) -> None:
+        if self.on_unit_done:
+            self.on_unit_done((result.group_id, result.topic_id), unit, error)
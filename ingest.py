@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import time
+from bisect import bisect_right
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from records import MessageRecord
+
+logger = logging.getLogger(__name__)
+
+IngestedItem = Tuple[int, MessageRecord]
+# Receives the buffered items sorted by message_id and the counters to add
+FlushFunc = Callable[[List[IngestedItem], Dict[str, int]], Awaitable[None]]
+
+
+def merge_in_order(message_ids: List[int], messages: List[MessageRecord], items: List[IngestedItem]) -> None:
+    """Insert items into the parallel lists, keeping them sorted by message_id"""
+    for message_id, record in items:
+        # Almost always appends; late album parts land back in place
+        index = bisect_right(message_ids, message_id)
+        message_ids.insert(index, message_id)
+        messages.insert(index, record)
+
+
+class IngestBuffer:
+    """Buffers incoming messages of one session and hands them over in batches.
+
+    A batch is flushed once no message arrived for `debounce` seconds, so the
+    parts of an album land together, but at most `max_wait` seconds after its
+    first message so a long stream of uploads still shows progress.
+    """
+
+    def __init__(self, flush: FlushFunc, debounce: float, max_wait: float):
+        self.flush_callback = flush
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self.pending: List[IngestedItem] = []
+        self.counts: Dict[str, int] = {}
+        self.first_at = 0.0
+        self.last_at = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+    def add(self, message_id: int, record: MessageRecord, counter: str) -> None:
+        now = time.monotonic()
+        if not self.pending:
+            self.first_at = now
+        self.last_at = now
+        self.pending.append((message_id, record))
+        self.counts[counter] = self.counts.get(counter, 0) + 1
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        try:
+            while self.pending:
+                delay = min(self.last_at + self.debounce, self.first_at + self.max_wait) - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                await self.flush()
+        except Exception as e:
+            logger.error(f"Flushing received messages failed: {e}")
+        finally:
+            self.task = None
+
+    async def flush(self) -> None:
+        """Hand over everything buffered so far"""
+        if not self.pending:
+            return
+        items = sorted(self.pending, key=lambda item: item[0])
+        counts = self.counts
+        self.pending = []
+        self.counts = {}
+        await self.flush_callback(items, counts)
+
+    def cancel(self) -> None:
+        """Drop buffered messages, e.g. when the session starts over"""
+        self.pending = []
+        self.counts = {}
+        if self.task:
+            self.task.cancel()
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import time
+from typing import Coroutine, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class JobProgress:
+    """Live counters of a running forwarding job"""
+
+    def __init__(self):
+        self.total = 0
+        self.sent = 0
+        self.failed = 0
+        self.started_at = time.monotonic()
+
+    @property
+    def remaining(self) -> int:
+        return max(self.total - self.sent - self.failed, 0)
+
+    def throughput(self) -> float:
+        """Settled messages per second since the job started"""
+        elapsed = time.monotonic() - self.started_at
+        return (self.sent + self.failed) / elapsed if elapsed > 0 else 0.0
+
+    def eta(self) -> Optional[float]:
+        """Seconds until the job is done at the current pace"""
+        rate = self.throughput()
+        return self.remaining / rate if rate > 0 else None
+
+    def snapshot(self) -> tuple:
+        return self.sent, self.failed, self.total
+
+
+class ForwardJob:
+    """A forwarding job running in the background, with its status message"""
+
+    def __init__(self, job_id: int, user_id: int, chat_id: int, message_id: int):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.progress = JobProgress()
+        self.task: Optional[asyncio.Task] = None
+        # Set when a user cancels the job, as opposed to a shutdown
+        self.stop_requested = False
+        # Also send the report as a JSON lines file (manifest jobs)
+        self.jsonl_report = False
+
+
+class JobRegistry:
+    """Tracks running forwarding jobs so they can be inspected or cancelled"""
+
+    def __init__(self):
+        self.jobs: Dict[int, ForwardJob] = {}
+
+    def start(self, job: ForwardJob, coro: Coroutine) -> None:
+        job.task = asyncio.create_task(coro)
+        self.jobs[job.job_id] = job
+        job.task.add_done_callback(lambda _: self.jobs.pop(job.job_id, None))
+
+    def get(self, job_id: int) -> Optional[ForwardJob]:
+        return self.jobs.get(job_id)
+
+    def running(self, user_id: Optional[int] = None) -> List[ForwardJob]:
+        """Running jobs, only those owned by `user_id` when given"""
+        return [job for job in self.jobs.values() if user_id is None or job.user_id == user_id]
+
+    def cancel(self, job_id: int, user_id: Optional[int] = None) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or job.task.done() or (user_id is not None and job.user_id != user_id):
+            return False
+        logger.info(f"Cancelling forwarding job {job_id}")
+        job.stop_requested = True
+        job.task.cancel()
+        return True
+
+    async def drain(self, timeout: float) -> None:
+        """Wait for running jobs to finish, interrupting those still running after `timeout`
+
+        Interrupted jobs keep their pending deliveries and resume on the next start.
+        """
+        tasks = [job.task for job in self.jobs.values()]
+        if not tasks:
+            return
+        logger.info(f"Waiting up to {timeout}s for {len(tasks)} forwarding job(s) to finish")
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"Interrupted {len(pending)} forwarding job(s), they will resume on restart")
+            await asyncio.gather(*pending, return_exceptions=True)
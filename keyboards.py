@@ -0,0 +1,65 @@
+from typing import Dict, List, Set, Tuple
+
+from telegram import InlineKeyboardButton
+
+
+class SelectionMenu:
+    """A paginated, filterable list of toggleable items.
+
+    The visible (filtered) order is computed once per filter, and buttons
+    are cached by (item, selected) so a toggle only rebuilds the one row
+    whose state changed.
+    """
+
+    def __init__(self, items: Dict[int, str], toggle_prefix: str, page_prefix: str, page_size: int):
+        self.items = items
+        self.toggle_prefix = toggle_prefix
+        self.page_prefix = page_prefix
+        self.page_size = max(page_size, 1)
+        self.query = ""
+        self.page = 0
+        self.visible: List[int] = list(items)
+        self._buttons: Dict[Tuple[int, bool], InlineKeyboardButton] = {}
+
+    def set_filter(self, query: str) -> None:
+        """Only show items whose name contains `query` (case-insensitive)"""
+        self.query = query.strip()
+        needle = self.query.casefold()
+        self.visible = [item_id for item_id, name in self.items.items() if needle in name.casefold()]
+        self.page = 0
+
+    @property
+    def page_count(self) -> int:
+        return max((len(self.visible) + self.page_size - 1) // self.page_size, 1)
+
+    def set_page(self, page: int) -> None:
+        self.page = min(max(page, 0), self.page_count - 1)
+
+    def _button(self, item_id: int, is_selected: bool) -> InlineKeyboardButton:
+        key = (item_id, is_selected)
+        button = self._buttons.get(key)
+        if button is None:
+            emoji = "✅" if is_selected else "◻️"
+            button = self._buttons[key] = InlineKeyboardButton(
+                f"{self.items[item_id]} {emoji}",
+                callback_data=f"{self.toggle_prefix}:{item_id}"
+            )
+        return button
+
+    def page_rows(self, selected: Set[int]) -> List[List[InlineKeyboardButton]]:
+        """Item rows of the current page followed by the page switcher"""
+        start = self.page * self.page_size
+        rows = [
+            [self._button(item_id, item_id in selected)]
+            for item_id in self.visible[start:start + self.page_size]
+        ]
+
+        if self.page_count > 1:
+            pager = []
+            if self.page > 0:
+                pager.append(InlineKeyboardButton("◀️", callback_data=f"{self.page_prefix}:{self.page - 1}"))
+            pager.append(InlineKeyboardButton(f"{self.page + 1}/{self.page_count}", callback_data="noop"))
+            if self.page < self.page_count - 1:
+                pager.append(InlineKeyboardButton("▶️", callback_data=f"{self.page_prefix}:{self.page + 1}"))
+            rows.append(pager)
+        return rows
@@ -1,23 +1,55 @@
 import os
+import sys
+import json
+import asyncio
+import argparse
 import logging
-from typing import Dict, List, Set, Optional
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
 from telegram import (
     Update,
     InlineKeyboardButton,
     InlineKeyboardMarkup,
     Message,
     BotCommand,
-    ForumTopic
+    ForumTopic,
+    InputFile,
+    InputMediaDocument,
+    InputMediaPhoto,
+    InputMediaVideo
 )
 from telegram.ext import (
     Application,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
+    ChatMemberHandler,
     ContextTypes,
+    ExtBot,
     filters
 )
+from telegram.error import BadRequest
+from albums import plan_batches
 from config import Config
+from fanout import Destination, DestinationResult, FanOutEngine
+from ingest import IngestBuffer, IngestedItem, merge_in_order
+from jobs import ForwardJob, JobProgress, JobRegistry
+from keyboards import SelectionMenu
+from manifest import Manifest, ManifestError, load_manifest, parse_manifest, validate_destinations
+from metadata import MetadataCache
+from metrics import InstrumentedBot, Metrics, instrument_handlers
+from outbox import EXCLUDED, FAILED, PENDING, SENT, SKIPPED, SYNC_CHAT_ID, Outbox
+from ratelimit import RateLimiter
+from records import MessageRecord
+from retry import RetryPolicy
+from scheduler import Scheduler, format_time, next_occurrence, parse_when
+from senders import Sender, SenderPool
+from sessions import Session, SessionManager
+from sync import ChannelSync
+from transport import PooledRequest
+from uploads import Uploader, list_files
+from webhook import run_webhook
 
 # Logging setup
 logging.basicConfig(
@@ -26,70 +58,96 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-class BotData:
-    def __init__(self):
-        self.reset()
-        
-    def reset(self):
-        self.received_items = {
-            'videos': 0,
-            'files': 0,
-            'texts': 0,
-            'others': 0
-        }
-        self.collecting = False
-        self.selected_groups: Set[int] = set()
-        self.selected_topics: Dict[int, Set[int]] = {}
-        self.messages_to_forward: List[Dict] = []
-        self.groups_info: Dict[int, Dict] = {}
-        self.current_group_index = 0
-
-bot_data = BotData()
+sessions = SessionManager(Config.MAX_SESSIONS, Config.SESSION_TTL)
+
+# Shared by every job so the bot-wide rate budget is never exceeded
+rate_limiter = RateLimiter(Config.GLOBAL_RATE_LIMIT, Config.CHAT_RATE_LIMIT, Config.CHAT_BURST)
+
+outbox = Outbox(Config.OUTBOX_PATH)
+
+job_registry = JobRegistry()
+
+# Extra sender bots from Config.SENDER_TOKENS, created in main()
+extra_senders: List[Sender] = []
+
+# Maintenance loops started in post_init, stopped on shutdown
+background_tasks: List[asyncio.Task] = []
+
+# Mirrors the sync source channel, started in post_init
+channel_sync = ChannelSync(
+    outbox, Config.SYNC_SOURCE_CHAT_ID, Config.SYNC_DESTINATIONS, Config.SYNC_DEBOUNCE, Config.SYNC_MAX_WAIT
+) if Config.SYNC_SOURCE_CHAT_ID else None
+
+# Timer queue of scheduled jobs, started in post_init
+scheduler = Scheduler(
+    lambda: sum(job.progress.remaining for job in job_registry.running()),
+    Config.GLOBAL_RATE_LIMIT,
+    Config.SCHEDULE_LARGE_JOB,
+    Config.SCHEDULE_MAX_DELAY
+)
+
+# Only created when the endpoint is enabled, so disabled metrics cost nothing
+metrics = Metrics() if Config.METRICS_PORT else None
+if metrics:
+    metrics.queue_depth.read = lambda: sum(job.progress.remaining for job in job_registry.running())
+
+metadata_cache = MetadataCache(Config.METADATA_CACHE_PATH, Config.METADATA_TTL, Config.METADATA_CONCURRENCY)
 
 async def fetch_groups_info(context: ContextTypes.DEFAULT_TYPE) -> Dict[int, Dict]:
-    """Fetch all groups and their topics where bot is admin"""
-    groups_info = {}
-    
-    for group_id in Config.GROUP_IDS:
-        try:
-            chat = await context.bot.get_chat(group_id)
-            
-            # Verify bot is admin
-            chat_member = await context.bot.get_chat_member(
-                chat_id=group_id,
-                user_id=context.bot.id
-            )
-            
-            if chat_member.status not in ['administrator', 'creator']:
-                logger.warning(f"Bot is not admin in group {group_id}")
-                continue
-            
-            # Initialize group info
-            groups_info[group_id] = {
-                'name': chat.title,
-                'topics': {}  # Will be populated when needed
-            }
-            
-        except Exception as e:
-            logger.error(f"Error processing group {group_id}: {e}")
+    """Fetch all groups where bot is admin, re-querying only stale ones"""
+    await metadata_cache.refresh(context.bot, Config.GROUP_IDS)
+    return metadata_cache.groups_info(Config.GROUP_IDS)
+
+async def load_groups_info(context: ContextTypes.DEFAULT_TYPE) -> Dict[int, Dict]:
+    """Cached groups right away, stale entries are refreshed in the background"""
+    groups_info = metadata_cache.groups_info(Config.GROUP_IDS)
+    if not groups_info:
+        return await fetch_groups_info(context)
     
+    metadata_cache.refresh_in_background(context.bot, Config.GROUP_IDS)
     return groups_info
 
-async def get_group_topics(context: ContextTypes.DEFAULT_TYPE, group_id: int) -> Dict[int, str]:
-    """Get topics for a specific group"""
-    try:
-        forum_topics = await context.bot.get_forum_topics(chat_id=group_id)
-        return {topic.message_thread_id: topic.name for topic in forum_topics.topics}
-    except Exception as e:
-        logger.error(f"Error getting topics for group {group_id}: {e}")
-        return {}
+async def track_membership(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Re-query a group on the next refresh once the bot's rights in it change"""
+    metadata_cache.invalidate(update.my_chat_member.chat.id)
+
+async def track_topics(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Learn forum topics and whether they are open from their service messages"""
+    message = update.effective_message
+    if message.chat_id not in Config.GROUP_IDS:
+        return
+    
+    name = closed = None
+    if message.forum_topic_created:
+        name = message.forum_topic_created.name
+    elif message.forum_topic_edited:
+        name = message.forum_topic_edited.name
+    elif message.forum_topic_closed:
+        closed = True
+    elif message.forum_topic_reopened:
+        closed = False
+    metadata_cache.update_topic(message.chat_id, message.message_thread_id, name=name, closed=closed)
+
+async def preflight(bot, destinations: List[Destination]) -> Dict[Destination, str]:
+    """Destinations the bot cannot post to, with the reason.
+
+    Group rights and topics come from the metadata cache; only stale groups
+    are re-queried, concurrently.
+    """
+    group_ids = list(dict.fromkeys(group_id for group_id, _ in destinations))
+    await metadata_cache.refresh(bot, group_ids)
+    problems = metadata_cache.destination_problems(destinations)
+    for (group_id, topic_id), problem in problems.items():
+        logger.warning(f"Leaving out {group_id}/{topic_id}: {problem}")
+    return problems
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if update.effective_user.id != Config.AUTHORIZED_USER_ID:
+    if update.effective_user.id not in Config.AUTHORIZED_USER_IDS:
         await update.message.reply_text("❌ Unauthorized access!")
         return
 
-    bot_data.groups_info = await fetch_groups_info(context)
+    session = sessions.get(update.effective_user.id)
+    session.groups_info = await load_groups_info(context)
     
     welcome_msg = (
         f"ʜᴇʟʟᴏ, {update.effective_user.full_name} ꜱɪʀ!\n\n"
@@ -106,11 +164,12 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 async def refresh_groups(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Refresh group list manually"""
+    session = sessions.get(update.effective_user.id)
     query = update.callback_query
     await query.answer()
     
-    bot_data.groups_info = await fetch_groups_info(context)
-    group_count = len(bot_data.groups_info)
+    session.groups_info = await fetch_groups_info(context)
+    group_count = len(session.groups_info)
     
     await query.edit_message_text(
         f"♻️ Refreshed group list!\n"
@@ -118,11 +177,12 @@ async def refresh_groups(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     )
 
 async def start_process(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    session = sessions.get(update.effective_user.id)
     query = update.callback_query
     await query.answer()
     
-    bot_data.reset()
-    bot_data.collecting = True
+    session.reset()
+    session.collecting = True
     await query.edit_message_text(
         "📤 Send me videos, files, text messages etc.\n"
         "When finished, send /done command\n\n"
@@ -130,54 +190,149 @@ async def start_process(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     )
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if not bot_data.collecting or update.effective_user.id != Config.AUTHORIZED_USER_ID:
+    if update.effective_user.id not in Config.AUTHORIZED_USER_IDS:
+        return
+
+    session = sessions.get(update.effective_user.id)
+    if session.search_target is not None and update.message.text:
+        await apply_search(update, context)
+        return
+
+    if not session.collecting:
         return
 
     message = update.message
-    
-    # Count received items
-    if message.video:
-        bot_data.received_items['videos'] += 1
-    elif message.document:
-        bot_data.received_items['files'] += 1
-    elif message.text and not message.text.startswith('/'):
-        bot_data.received_items['texts'] += 1
-    else:
-        bot_data.received_items['others'] += 1
-    
-    # Store message for forwarding
-    msg_data = {
-        'type': 'video' if message.video else 
-               'document' if message.document else 
-               'photo' if message.photo else 
-               'text',
-        'content': message.video or message.document or 
-                  (message.photo[-1] if message.photo else None) or 
-                  message.text,
-        'caption': message.caption,
-        'entities': message.entities or message.caption_entities
-    }
-    bot_data.messages_to_forward.append(msg_data)
+    # Store only what is needed to send the message again
+    record = MessageRecord.from_message(message)
+
+    if session.ingest is None:
+        session.ingest = IngestBuffer(
+            lambda items, counts: ingest_received(context.bot, session, update.effective_chat.id, items, counts),
+            Config.INGEST_DEBOUNCE,
+            Config.INGEST_MAX_WAIT
+        )
+    session.ingest.add(message.message_id, record, received_counter(record))
+
+def received_counter(record: MessageRecord) -> str:
+    """Which received_items counter a collected message counts towards"""
+    if record.type == 'video':
+        return 'videos'
+    if record.type == 'document':
+        return 'files'
+    if record.type == 'text' and not record.text.startswith('/'):
+        return 'texts'
+    return 'others'
+
+def format_received(received_items: Dict[str, int]) -> str:
+    return (
+        f"📥 Received {sum(received_items.values())} items so far\n"
+        f"🎥 {received_items['videos']} · 📁 {received_items['files']} · "
+        f"📝 {received_items['texts']} · 📦 {received_items['others']}\n\n"
+        "Send /done when finished."
+    )
+
+async def ingest_received(bot, session: Session, chat_id: int, items: List[IngestedItem],
+                          counts: Dict[str, int]) -> None:
+    """Merge a batch of received messages and refresh the live receipt"""
+    merge_in_order(session.message_ids, session.messages_to_forward, items)
+    for counter, count in counts.items():
+        session.received_items[counter] += count
+    if not session.collecting:
+        return
+
+    text = format_received(session.received_items)
+    await rate_limiter.acquire(chat_id)
+    try:
+        if session.receipt_message_id is None:
+            session.receipt_message_id = (await bot.send_message(chat_id=chat_id, text=text)).message_id
+        else:
+            await bot.edit_message_text(chat_id=chat_id, message_id=session.receipt_message_id, text=text)
+    except BadRequest as e:
+        if "not modified" not in str(e):
+            logger.warning(f"Updating the receipt for {chat_id} failed: {e}")
+
+def resolve_upload_directory(name: str) -> Optional[Path]:
+    """Directory below UPLOAD_ROOT named by the operator, None if outside or missing"""
+    root = Path(Config.UPLOAD_ROOT).resolve()
+    directory = (root / name).resolve()
+    if directory != root and root not in directory.parents:
+        return None
+    return directory if directory.is_dir() else None
+
+def create_uploader(bot, staging_chat_id: int) -> Uploader:
+    retry_policy = RetryPolicy(Config.SEND_MAX_RETRIES, Config.RETRY_BASE_DELAY, Config.RETRY_MAX_DELAY)
+    return Uploader(
+        bot, staging_chat_id, rate_limiter, retry_policy, Config.UPLOAD_CONCURRENCY, outbox, Config.UPLOAD_TIMEOUT
+    )
+
+async def upload_directory(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Upload the files of a server directory once and collect them like received messages"""
+    if update.effective_user.id not in Config.AUTHORIZED_USER_IDS:
+        return
+
+    session = sessions.get(update.effective_user.id)
+    if not Config.UPLOAD_ROOT:
+        await update.message.reply_text("❌ Uploads are disabled, set UPLOAD_ROOT to enable them.")
+        return
+    if not session.collecting:
+        await update.message.reply_text("❌ Press Start Process first, then send /upload <directory>.")
+        return
+
+    directory = resolve_upload_directory(" ".join(context.args))
+    if directory is None:
+        await update.message.reply_text("❌ No such directory below the upload root.")
+        return
+    files = list_files(directory)
+    if not files:
+        await update.message.reply_text("❌ The directory has no files.")
+        return
+
+    status_msg = await update.message.reply_text(f"📤 Uploading {len(files)} files from {directory.name}...")
+    uploader = create_uploader(context.bot, Config.STAGING_CHAT_ID or update.effective_chat.id)
+    results = await uploader.upload_all(files)
+
+    # Uploaded files go after everything received so far, in file name order
+    if session.ingest:
+        await session.ingest.flush()
+    after = session.message_ids[-1] if session.message_ids else 0
+    records = [result.record for result in results if result.record]
+    merge_in_order(session.message_ids, session.messages_to_forward, [(after, record) for record in records])
+    for record in records:
+        session.received_items[received_counter(record)] += 1
+
+    failed = [result for result in results if result.error]
+    report = (
+        f"📤 Uploaded {len(records)} of {len(files)} files "
+        f"({sum(result.reused for result in results)} reused from earlier uploads)"
+    )
+    if failed:
+        report += "\n\n" + "\n".join(f"❌ {result.path.name}: {result.error}" for result in failed[:10])
+        if len(failed) > 10:
+            report += f"\n… and {len(failed) - 10} more"
+    await status_msg.edit_text(report + "\n\nSend more or /done when finished.")
 
 async def done(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if update.effective_user.id != Config.AUTHORIZED_USER_ID:
+    if update.effective_user.id not in Config.AUTHORIZED_USER_IDS:
         return
 
-    bot_data.collecting = False
+    session = sessions.get(update.effective_user.id)
+    session.collecting = False
+    if session.ingest:
+        await session.ingest.flush()
     
     report = (
         "📊 Received Items Summary:\n\n"
-        f"🎥 Videos - {bot_data.received_items['videos']}\n"
-        f"📁 Files - {bot_data.received_items['files']}\n"
-        f"📝 Text Messages - {bot_data.received_items['texts']}\n"
-        f"📦 Others - {bot_data.received_items['others']}\n\n"
-        f"🔢 Total - {sum(bot_data.received_items.values())}"
+        f"🎥 Videos - {session.received_items['videos']}\n"
+        f"📁 Files - {session.received_items['files']}\n"
+        f"📝 Text Messages - {session.received_items['texts']}\n"
+        f"📦 Others - {session.received_items['others']}\n\n"
+        f"🔢 Total - {sum(session.received_items.values())}"
     )
     
-    if not bot_data.groups_info:
-        bot_data.groups_info = await fetch_groups_info(context)
+    if not session.groups_info:
+        session.groups_info = await load_groups_info(context)
     
-    if not bot_data.groups_info:
+    if not session.groups_info:
         await update.message.reply_text(
             "❌ No groups found where I'm admin!\n"
             "Please add me to groups and make me admin first."
@@ -187,119 +342,170 @@ async def done(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     keyboard = [[InlineKeyboardButton("Select Groups", callback_data="select_groups")]]
     await update.message.reply_text(report, reply_markup=InlineKeyboardMarkup(keyboard))
 
-def create_group_keyboard() -> InlineKeyboardMarkup:
-    keyboard = []
-    for group_id, group_info in bot_data.groups_info.items():
-        is_selected = group_id in bot_data.selected_groups
-        emoji = "✅" if is_selected else "◻️"
-        keyboard.append([
-            InlineKeyboardButton(
-                f"{group_info['name']} {emoji}",
-                callback_data=f"toggle_group:{group_id}"
-            )
-        ])
+def group_menu_text(session: Session) -> str:
+    text = "👥 Select Groups to Forward:"
+    if session.group_menu and session.group_menu.query:
+        text += f"\n🔍 Filter: {session.group_menu.query}"
+    return text
+
+def search_row(menu: SelectionMenu, target: str) -> List[InlineKeyboardButton]:
+    row = [InlineKeyboardButton("🔍 Search", callback_data=f"search:{target}")]
+    if menu.query:
+        row.append(InlineKeyboardButton("✖️ Clear Filter", callback_data=f"clear_search:{target}"))
+    return row
+
+def skips_duplicates(session: Session) -> bool:
+    if session.skip_duplicates is None:
+        return Config.SKIP_DUPLICATES
+    return session.skip_duplicates
+
+def create_group_keyboard(session: Session) -> InlineKeyboardMarkup:
+    menu = session.group_menu
+    keyboard = menu.page_rows(session.selected_groups)
+    keyboard.append(search_row(menu, "groups"))
     
     keyboard.append([
         InlineKeyboardButton("Select All", callback_data="select_all_groups"),
         InlineKeyboardButton("Deselect All", callback_data="deselect_all_groups")
     ])
     
+    keyboard.append([
+        InlineKeyboardButton(
+            f"♻️ Skip already sent: {'ON' if skips_duplicates(session) else 'OFF'}",
+            callback_data="toggle_duplicates"
+        )
+    ])
+    
     keyboard.append([
         InlineKeyboardButton("Proceed to Topics ➡️", callback_data="confirm_send")
     ])
     
     return InlineKeyboardMarkup(keyboard)
 
+async def answer_menu(query, session: Session, target: str) -> bool:
+    """Answer a menu button press; False if the menu is gone with a reset or evicted session"""
+    if search_menu(session, target) is None:
+        await query.answer("⌛ Menu expired, send /done again", show_alert=True)
+        return False
+    await query.answer()
+    return True
+
 async def select_groups(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    session = sessions.get(update.effective_user.id)
     query = update.callback_query
     await query.answer()
     
-    await query.edit_message_text(
-        "👥 Select Groups to Forward:",
-        reply_markup=create_group_keyboard()
+    session.group_menu = SelectionMenu(
+        {group_id: group_info['name'] for group_id, group_info in session.groups_info.items()},
+        "toggle_group",
+        "groups_page",
+        Config.KEYBOARD_PAGE_SIZE
     )
+    await query.edit_message_text(group_menu_text(session), reply_markup=create_group_keyboard(session))
+
+async def groups_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    session = sessions.get(update.effective_user.id)
+    query = update.callback_query
+    if not await answer_menu(query, session, "groups"):
+        return
+    
+    session.group_menu.set_page(int(query.data.split(':')[1]))
+    await query.edit_message_reply_markup(create_group_keyboard(session))
 
 async def toggle_group(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    session = sessions.get(update.effective_user.id)
     query = update.callback_query
-    await query.answer()
+    if not await answer_menu(query, session, "groups"):
+        return
 
     group_id = int(query.data.split(':')[1])
     
-    if group_id in bot_data.selected_groups:
-        bot_data.selected_groups.remove(group_id)
-        if group_id in bot_data.selected_topics:
-            del bot_data.selected_topics[group_id]
+    if group_id in session.selected_groups:
+        session.selected_groups.remove(group_id)
+        if group_id in session.selected_topics:
+            del session.selected_topics[group_id]
     else:
-        bot_data.selected_groups.add(group_id)
+        session.selected_groups.add(group_id)
     
-    await query.edit_message_reply_markup(create_group_keyboard())
+    await query.edit_message_reply_markup(create_group_keyboard(session))
 
 async def select_all_groups(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    session = sessions.get(update.effective_user.id)
     query = update.callback_query
-    await query.answer()
+    if not await answer_menu(query, session, "groups"):
+        return
 
-    bot_data.selected_groups = set(bot_data.groups_info.keys())
-    await query.edit_message_reply_markup(create_group_keyboard())
+    # With a filter active only the matching groups are affected
+    session.selected_groups |= set(session.group_menu.visible)
+    await query.edit_message_reply_markup(create_group_keyboard(session))
 
 async def deselect_all_groups(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    session = sessions.get(update.effective_user.id)
     query = update.callback_query
-    await query.answer()
+    if not await answer_menu(query, session, "groups"):
+        return
 
-    bot_data.selected_groups = set()
-    bot_data.selected_topics = {}
-    await query.edit_message_reply_markup(create_group_keyboard())
+    for group_id in session.group_menu.visible:
+        session.selected_groups.discard(group_id)
+        session.selected_topics.pop(group_id, None)
+    await query.edit_message_reply_markup(create_group_keyboard(session))
 
 async def confirm_send(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    session = sessions.get(update.effective_user.id)
     query = update.callback_query
-    await query.answer()
 
-    if not bot_data.selected_groups:
+    if not session.selected_groups:
         await query.answer("Please select at least one group!", show_alert=True)
         return
+    await query.answer()
     
     # Initialize topic selection
-    bot_data.selected_topics = {}
-    groups_with_topics = []
+    session.selected_topics = {}
+    session.topic_menus = {}
     
-    for group_id in bot_data.selected_groups:
-        # Get topics for this group
-        topics = await get_group_topics(context, group_id)
+    # Get topics for all selected groups at once
+    topics_by_group = metadata_cache.get_topics(session.selected_groups)
+    
+    for group_id, topics in topics_by_group.items():
         if topics:
-            bot_data.selected_topics[group_id] = set(topics.keys())
-            groups_with_topics.append(group_id)
+            session.selected_topics[group_id] = set(topics.keys())
+            session.topic_menus[group_id] = SelectionMenu(
+                topics,
+                f"toggle_topic:{group_id}",
+                f"topics_page:{group_id}",
+                Config.KEYBOARD_PAGE_SIZE
+            )
         # Update group info with topics
-        if group_id in bot_data.groups_info:
-            bot_data.groups_info[group_id]['topics'] = topics
+        if group_id in session.groups_info:
+            session.groups_info[group_id]['topics'] = topics
+    
+    # Navigation order between groups with topics, computed once
+    session.topic_groups = [group_id for group_id in session.groups_info if group_id in session.topic_menus]
+    session.topic_group_index = {group_id: index for index, group_id in enumerate(session.topic_groups)}
     
-    if groups_with_topics:
+    if session.topic_groups:
         # Show topics for first group
-        bot_data.current_group_index = 0
-        first_group_id = groups_with_topics[0]
-        await show_topic_selection(update, context, first_group_id)
+        await show_topic_selection(update, context, session.topic_groups[0])
     else:
         # No groups with topics found, forward directly
-        await forward_messages(update, context)
-
-def create_topic_keyboard(group_id: int) -> InlineKeyboardMarkup:
-    group_info = bot_data.groups_info[group_id]
-    keyboard = []
-    
-    # Add all topics with selection status
-    for topic_id, topic_name in group_info.get('topics', {}).items():
-        is_selected = topic_id in bot_data.selected_topics.get(group_id, set())
-        emoji = "✅" if is_selected else "◻️"
-        keyboard.append([
-            InlineKeyboardButton(
-                f"{topic_name} {emoji}",
-                callback_data=f"toggle_topic:{group_id}:{topic_id}"
-            )
-        ])
+        await forward_messages(update, context, answered=True)
+
+def topic_menu_text(session: Session, group_id: int) -> str:
+    text = (
+        f"📌 Selecting topics in: {session.groups_info[group_id]['name']}\n"
+        "✅ = Selected | ◻️ = Not Selected"
+    )
+    if session.topic_menus[group_id].query:
+        text += f"\n🔍 Filter: {session.topic_menus[group_id].query}"
+    return text
+
+def create_topic_keyboard(session: Session, group_id: int) -> InlineKeyboardMarkup:
+    menu = session.topic_menus[group_id]
+    keyboard = menu.page_rows(session.selected_topics.get(group_id, set()))
     
     # Navigation between groups with topics
-    groups_with_topics = [gid for gid in bot_data.selected_groups 
-                         if gid in bot_data.groups_info 
-                         and bot_data.groups_info[gid].get('topics')]
-    current_index = groups_with_topics.index(group_id)
+    groups_with_topics = session.topic_groups
+    current_index = session.topic_group_index[group_id]
     
     nav_buttons = []
     if current_index > 0:
@@ -317,6 +523,8 @@ def create_topic_keyboard(group_id: int) -> InlineKeyboardMarkup:
     if nav_buttons:
         keyboard.append(nav_buttons)
     
+    keyboard.append(search_row(menu, f"topics:{group_id}"))
+    
     # Control buttons
     keyboard.append([
         InlineKeyboardButton("Select All", callback_data=f"select_all_topics:{group_id}"),
@@ -324,162 +532,946 @@ def create_topic_keyboard(group_id: int) -> InlineKeyboardMarkup:
     ])
     
     keyboard.append([
-        InlineKeyboardButton("✅ Finish & Forward", callback_data="forward_messages")
+        InlineKeyboardButton(
+            "⏰ Finish & Schedule" if session.schedule else "✅ Finish & Forward",
+            callback_data="forward_messages"
+        )
     ])
     
     return InlineKeyboardMarkup(keyboard)
 
-async def show_topic_selection(update: Update, context: ContextTypes.DEFAULT_TYPE, group_id: int) -> None:
+async def show_topic_selection(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                               group_id: Optional[int] = None) -> None:
+    session = sessions.get(update.effective_user.id)
     query = update.callback_query
-    await query.answer()
+    if group_id is None:
+        # Reached through the "select_topics:<group_id>" buttons
+        group_id = int(query.data.split(':')[1])
+        if not await answer_menu(query, session, f"topics:{group_id}"):
+            return
     
-    group_info = bot_data.groups_info[group_id]
-    await query.edit_message_text(
-        f"📌 Selecting topics in: {group_info['name']}\n"
-        "✅ = Selected | ◻️ = Not Selected",
-        reply_markup=create_topic_keyboard(group_id)
-    )
+    await query.edit_message_text(topic_menu_text(session, group_id), reply_markup=create_topic_keyboard(session, group_id))
+
+async def topics_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    session = sessions.get(update.effective_user.id)
+    query = update.callback_query
+    _, group_id, page = query.data.split(':')
+    group_id = int(group_id)
+    if not await answer_menu(query, session, f"topics:{group_id}"):
+        return
+    session.topic_menus[group_id].set_page(int(page))
+    await query.edit_message_reply_markup(create_topic_keyboard(session, group_id))
 
 async def toggle_topic(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    session = sessions.get(update.effective_user.id)
     query = update.callback_query
-    await query.answer()
-    
     _, group_id, topic_id = query.data.split(':')
     group_id = int(group_id)
     topic_id = int(topic_id)
+    if not await answer_menu(query, session, f"topics:{group_id}"):
+        return
     
-    if group_id not in bot_data.selected_topics:
-        bot_data.selected_topics[group_id] = set()
+    if group_id not in session.selected_topics:
+        session.selected_topics[group_id] = set()
     
-    if topic_id in bot_data.selected_topics[group_id]:
-        bot_data.selected_topics[group_id].remove(topic_id)
+    if topic_id in session.selected_topics[group_id]:
+        session.selected_topics[group_id].remove(topic_id)
     else:
-        bot_data.selected_topics[group_id].add(topic_id)
+        session.selected_topics[group_id].add(topic_id)
     
-    await query.edit_message_reply_markup(create_topic_keyboard(group_id))
+    await query.edit_message_reply_markup(create_topic_keyboard(session, group_id))
 
 async def select_all_topics(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    session = sessions.get(update.effective_user.id)
     query = update.callback_query
-    await query.answer()
-    
     group_id = int(query.data.split(':')[1])
-    if group_id in bot_data.groups_info and 'topics' in bot_data.groups_info[group_id]:
-        bot_data.selected_topics[group_id] = set(bot_data.groups_info[group_id]['topics'].keys())
-    await query.edit_message_reply_markup(create_topic_keyboard(group_id))
+    if not await answer_menu(query, session, f"topics:{group_id}"):
+        return
+    selected = session.selected_topics.setdefault(group_id, set())
+    selected |= set(session.topic_menus[group_id].visible)
+    await query.edit_message_reply_markup(create_topic_keyboard(session, group_id))
 
 async def deselect_all_topics(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    session = sessions.get(update.effective_user.id)
     query = update.callback_query
-    await query.answer()
-    
     group_id = int(query.data.split(':')[1])
-    if group_id in bot_data.selected_topics:
-        bot_data.selected_topics[group_id] = set()
-    await query.edit_message_reply_markup(create_topic_keyboard(group_id))
+    if not await answer_menu(query, session, f"topics:{group_id}"):
+        return
+    if group_id in session.selected_topics:
+        session.selected_topics[group_id] -= set(session.topic_menus[group_id].visible)
+    await query.edit_message_reply_markup(create_topic_keyboard(session, group_id))
+
+def search_menu(session: Session, target: str) -> Optional[SelectionMenu]:
+    """Menu addressed by a search target, see Session.search_target; None once it is gone"""
+    if target == "groups":
+        return session.group_menu
+    return session.topic_menus.get(int(target.split(':')[1]))
 
-async def forward_messages(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def start_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    session = sessions.get(update.effective_user.id)
     query = update.callback_query
-    if query:
-        await query.answer()
+    target = query.data.split(':', 1)[1]
+    if not await answer_menu(query, session, target):
+        return
     
-    if not bot_data.messages_to_forward:
-        await (query.edit_message_text if query else update.message.reply_text)(
-            "❌ No messages to forward!"
+    session.search_target = target
+    await query.edit_message_text("🔍 Send me the text to filter the list by:")
+
+async def clear_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    session = sessions.get(update.effective_user.id)
+    query = update.callback_query
+    target = query.data.split(':', 1)[1]
+    if not await answer_menu(query, session, target):
+        return
+    
+    search_menu(session, target).set_filter("")
+    if target == "groups":
+        await query.edit_message_text(group_menu_text(session), reply_markup=create_group_keyboard(session))
+    else:
+        group_id = int(target.split(':')[1])
+        await query.edit_message_text(topic_menu_text(session, group_id), reply_markup=create_topic_keyboard(session, group_id))
+
+async def apply_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Filter the menu waiting for a search text and show it again"""
+    session = sessions.get(update.effective_user.id)
+    target = session.search_target
+    session.search_target = None
+    search_menu(session, target).set_filter(update.message.text)
+    
+    if target == "groups":
+        await update.message.reply_text(group_menu_text(session), reply_markup=create_group_keyboard(session))
+    else:
+        group_id = int(target.split(':')[1])
+        await update.message.reply_text(topic_menu_text(session, group_id), reply_markup=create_topic_keyboard(session, group_id))
+
+async def toggle_duplicates(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Let this job send content that was already delivered before"""
+    session = sessions.get(update.effective_user.id)
+    query = update.callback_query
+    if not await answer_menu(query, session, "groups"):
+        return
+    
+    session.skip_duplicates = not skips_duplicates(session)
+    await query.edit_message_reply_markup(create_group_keyboard(session))
+
+async def noop(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.callback_query.answer()
+
+async def send_item(bot, chat_id: int, topic_id: Optional[int], msg: MessageRecord) -> None:
+    """Send one stored message to a chat, optionally inside a forum topic"""
+    if msg.type == 'text':
+        await bot.send_message(
+            chat_id=chat_id,
+            message_thread_id=topic_id if topic_id else None,
+            text=msg.content,
+            entities=msg.entities
+        )
+    elif msg.type == 'photo':
+        await bot.send_photo(
+            chat_id=chat_id,
+            message_thread_id=topic_id if topic_id else None,
+            photo=msg.content,
+            caption=msg.caption,
+            caption_entities=msg.entities
+        )
+    elif msg.type == 'video':
+        await bot.send_video(
+            chat_id=chat_id,
+            message_thread_id=topic_id if topic_id else None,
+            video=msg.content,
+            caption=msg.caption,
+            caption_entities=msg.entities
         )
+    elif msg.type == 'document':
+        await bot.send_document(
+            chat_id=chat_id,
+            message_thread_id=topic_id if topic_id else None,
+            document=msg.content,
+            caption=msg.caption,
+            caption_entities=msg.entities
+        )
+    elif msg.type == 'copy':
+        await bot.copy_message(
+            chat_id=chat_id,
+            message_thread_id=topic_id if topic_id else None,
+            from_chat_id=msg.source_chat_id,
+            message_id=msg.source_message_id
+        )
+
+INPUT_MEDIA_TYPES = {
+    'photo': InputMediaPhoto,
+    'video': InputMediaVideo,
+    'document': InputMediaDocument
+}
+
+async def send_batch(bot, chat_id: int, topic_id: Optional[int], batch: List[MessageRecord]) -> None:
+    """Send a single message, or several media items as one album"""
+    if len(batch) == 1:
+        await send_item(bot, chat_id, topic_id, batch[0])
         return
+    
+    media = [
+        INPUT_MEDIA_TYPES[msg.type](
+            media=msg.content,
+            caption=msg.caption,
+            caption_entities=msg.entities
+        )
+        for msg in batch
+    ]
+    await bot.send_media_group(
+        chat_id=chat_id,
+        message_thread_id=topic_id if topic_id else None,
+        media=media
+    )
 
-    total_messages = len(bot_data.messages_to_forward)
-    total_targets = 0
+def build_report(job_id: int, results: List[DestinationResult],
+                 footer: str = "✔️ Forwarding completed!") -> str:
+    """Render the per-destination delivery report of a job"""
+    _, groups_info = outbox.job_info(job_id)
+    counts = outbox.counts(job_id)
+    retries = {(result.group_id, result.topic_id): result for result in results}
+    destinations = outbox.destinations(job_id)
+    exclusions = outbox.exclusions(job_id)
+    
     report = "🚀 Forwarding Report:\n\n"
+    total_messages = 0
     
-    for group_id in bot_data.selected_groups:
-        group_name = bot_data.groups_info[group_id]['name']
+    for destination in destinations:
+        group_id, topic_id = destination
+        group_info = groups_info[group_id]
+        topic_name = ""
+        if topic_id is not None:
+            topic_name = f" (Topic: {group_info['topics'].get(topic_id, 'Unknown')})"
         
-        # Get topics for this group (None means general chat)
-        topic_ids = bot_data.selected_topics.get(group_id, {None})
-        
-        for topic_id in topic_ids:
-            topic_name = ""
-            if topic_id is not None:
-                topic_name = f" (Topic: {bot_data.groups_info[group_id]['topics'].get(topic_id, 'Unknown')})"
-            
-            report += f"➡️ {group_name}{topic_name}:\n"
-            success, failed = 0, 0
-            
-            for msg in bot_data.messages_to_forward:
-                try:
-                    if msg['type'] == 'text':
-                        await context.bot.send_message(
-                            chat_id=group_id,
-                            message_thread_id=topic_id if topic_id else None,
-                            text=msg['content'],
-                            entities=msg['entities']
-                        )
-                    elif msg['type'] == 'photo':
-                        await context.bot.send_photo(
-                            chat_id=group_id,
-                            message_thread_id=topic_id if topic_id else None,
-                            photo=msg['content'],
-                            caption=msg['caption'],
-                            caption_entities=msg['entities']
-                        )
-                    elif msg['type'] == 'video':
-                        await context.bot.send_video(
-                            chat_id=group_id,
-                            message_thread_id=topic_id if topic_id else None,
-                            video=msg['content'],
-                            caption=msg['caption'],
-                            caption_entities=msg['entities']
-                        )
-                    elif msg['type'] == 'document':
-                        await context.bot.send_document(
-                            chat_id=group_id,
-                            message_thread_id=topic_id if topic_id else None,
-                            document=msg['content'],
-                            caption=msg['caption'],
-                            caption_entities=msg['entities']
-                        )
-                    success += 1
-                except Exception as e:
-                    failed += 1
-                    logger.error(f"Forwarding failed to {group_id}/{topic_id}: {e}")
-            
-            total_targets += 1
-            report += f"   ✅ {success} | ❌ {failed}\n"
+        status = counts.get(destination, {})
+        total_messages = max(total_messages, sum(status.values()))
+        report += f"➡️ {group_info['name']}{topic_name}:\n"
+        report += f"   ✅ {status.get(SENT, 0)} | ❌ {status.get(FAILED, 0)}"
+        if status.get(SKIPPED):
+            report += f" | ⏭️ {status[SKIPPED]}"
+        result = retries.get(destination)
+        if result and result.retries:
+            report += f" | 🔁 {result.retries} ({result.wait_time:.0f}s)"
+        report += "\n"
+        if destination in exclusions:
+            report += f"   ⛔ {status.get(EXCLUDED, 0)} not sent: {exclusions[destination]}\n"
     
+    total_skipped = sum(status.get(SKIPPED, 0) for status in counts.values())
+    total_retries = sum(result.retries for result in results)
+    total_wait = sum(result.wait_time for result in results)
     report += (
         f"\n📊 Summary:\n"
         f"• {total_messages} messages\n"
-        f"• {len(bot_data.selected_groups)} groups\n"
-        f"• {total_targets} total destinations\n"
-        f"\n✔️ Forwarding completed!"
+        f"• {len({group_id for group_id, _ in destinations})} groups\n"
+        f"• {len(destinations)} total destinations ({len(exclusions)} unreachable)\n"
+        f"• {total_skipped} duplicates skipped\n"
+        f"• {total_retries} retries ({total_wait:.0f}s waited)\n"
+        f"\n{footer}"
+    )
+    return report
+
+def report_lines(job_id: int, results: List[DestinationResult]) -> List[Dict]:
+    """Machine-readable job report: one entry per destination, then a summary"""
+    _, groups_info = outbox.job_info(job_id)
+    counts = outbox.counts(job_id)
+    retries = {(result.group_id, result.topic_id): result for result in results}
+    exclusions = outbox.exclusions(job_id)
+    
+    lines = []
+    for destination in outbox.destinations(job_id):
+        group_id, topic_id = destination
+        status = counts.get(destination, {})
+        result = retries.get(destination)
+        lines.append({
+            'event': 'destination',
+            'job_id': job_id,
+            'group_id': group_id,
+            'topic_id': topic_id,
+            'group': groups_info[group_id]['name'],
+            'topic': groups_info[group_id]['topics'].get(topic_id) if topic_id is not None else None,
+            'sent': status.get(SENT, 0),
+            'failed': status.get(FAILED, 0),
+            'skipped': status.get(SKIPPED, 0),
+            'excluded': status.get(EXCLUDED, 0),
+            'excluded_reason': exclusions.get(destination),
+            'pending': status.get(PENDING, 0),
+            'retries': result.retries if result else 0,
+            'wait_time': round(result.wait_time, 3) if result else 0.0
+        })
+    
+    summary = {'event': 'summary', 'job_id': job_id, 'destinations': len(lines)}
+    for key in ('sent', 'failed', 'skipped', 'excluded', 'pending', 'retries'):
+        summary[key] = sum(line[key] for line in lines)
+    lines.append(summary)
+    return lines
+
+async def run_forward_job(bot, job_id: int, progress: Optional[JobProgress] = None) -> List[DestinationResult]:
+    """Send everything still pending in an outbox job, then close the job"""
+    pending = outbox.pending_plan(job_id)
+    plan = {destination: plan_batches(messages) for destination, messages in pending.items()}
+    progress = progress or JobProgress()
+    progress.total = sum(len(messages) for messages in pending.values())
+    
+    def on_unit_done(destination: Destination, batch: List[MessageRecord], error: Optional[Exception]) -> None:
+        positions = [msg.position for msg in batch]
+        if error is None:
+            outbox.mark(job_id, destination, positions, SENT)
+            progress.sent += len(batch)
+        else:
+            outbox.mark(job_id, destination, positions, FAILED, str(error))
+            progress.failed += len(batch)
+    
+    def on_retry(destination: Destination, error: Exception, delay: float) -> None:
+        metrics.retries.inc(destination[0], type(error).__name__)
+    
+    def on_dead(destination: Destination, batches: List[List[MessageRecord]], error: Exception) -> None:
+        positions = [msg.position for batch in batches for msg in batch]
+        outbox.mark(job_id, destination, positions, EXCLUDED, f"unreachable: {error}")
+        progress.failed += len(positions)
+        # Rights may have changed, let the next pre-flight check ask again
+        metadata_cache.invalidate(destination[0])
+        if destination[1] is not None and 'topic_closed' in str(error).lower():
+            # Cleared again by the topic's reopened service message
+            metadata_cache.update_topic(destination[0], destination[1], closed=True)
+    
+    retry_policy = RetryPolicy(Config.SEND_MAX_RETRIES, Config.RETRY_BASE_DELAY, Config.RETRY_MAX_DELAY)
+    # The primary bot shares its budget with status edits, extra tokens have their own
+    pool = SenderPool(Sender(bot, rate_limiter, "primary"), extra_senders)
+    engine = FanOutEngine(
+        send_batch, pool, Config.FORWARD_CONCURRENCY, retry_policy,
+        on_unit_done, on_retry if metrics else None, on_dead
+    )
+    results = await engine.run(plan)
+    outbox.finish_job(job_id)
+    return results
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes}m"
+    if minutes:
+        return f"{minutes}m {seconds}s"
+    return f"{seconds}s"
+
+def format_progress(job: ForwardJob) -> str:
+    progress = job.progress
+    eta = progress.eta()
+    return (
+        f"🚀 Forwarding job #{job.job_id} in progress...\n\n"
+        f"✅ {progress.sent} | ❌ {progress.failed} | ⏳ {progress.remaining} left\n"
+        f"⚡ {progress.throughput():.1f} msg/s | "
+        f"ETA {format_duration(eta) if eta is not None else '—'}"
     )
+
+async def update_status(bot, job: ForwardJob, text: str) -> None:
+    """Edit the job's status message, falling back to a new message"""
+    # Status edits share the bot-wide budget with the sends themselves
+    await rate_limiter.acquire(job.chat_id)
+    try:
+        await bot.edit_message_text(chat_id=job.chat_id, message_id=job.message_id, text=text)
+    except BadRequest as e:
+        if "not modified" in str(e):
+            return
+        # The old message is gone (e.g. deleted), edit the new one from now on
+        message = await bot.send_message(chat_id=job.chat_id, text=text)
+        job.message_id = message.message_id
+
+async def watch_progress(bot, job: ForwardJob) -> None:
+    """Show live progress, editing the status message at most every PROGRESS_INTERVAL seconds"""
+    shown = None
+    while True:
+        await asyncio.sleep(Config.PROGRESS_INTERVAL)
+        if job.progress.snapshot() == shown:
+            continue
+        shown = job.progress.snapshot()
+        try:
+            await update_status(bot, job, format_progress(job))
+        except Exception as e:
+            logger.warning(f"Progress update for job {job.job_id} failed: {e}")
+
+async def execute_job(bot, job: ForwardJob) -> None:
+    """Run a job in the background and finish with its report"""
+    watcher = asyncio.create_task(watch_progress(bot, job))
+    results: List[DestinationResult] = []
+    try:
+        results = await run_forward_job(bot, job.job_id, job.progress)
+        report = build_report(job.job_id, results)
+    except asyncio.CancelledError:
+        if not job.stop_requested:
+            # Shutting down: keep the pending deliveries so the job resumes on restart
+            raise
+        outbox.cancel_job(job.job_id)
+        report = build_report(job.job_id, [], footer="⛔ Forwarding cancelled!")
+    except Exception as e:
+        logger.error(f"Forwarding job {job.job_id} failed: {e}")
+        report = build_report(job.job_id, [], footer=f"❌ Forwarding stopped: {e}")
+    finally:
+        watcher.cancel()
+    
+    await update_status(bot, job, report)
+    if job.jsonl_report:
+        lines = "\n".join(json.dumps(line, ensure_ascii=False) for line in report_lines(job.job_id, results))
+        await bot.send_document(
+            chat_id=job.chat_id,
+            document=InputFile(lines.encode(), filename=f"job-{job.job_id}.jsonl")
+        )
+
+async def forward_messages(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                           answered: bool = False) -> None:
+    session = sessions.get(update.effective_user.id)
+    query = update.callback_query
+    if query and not answered:
+        # Reached through the "Finish & Forward" button; confirm_send answers itself
+        await query.answer()
+    
+    if not session.messages_to_forward:
+        await (query.edit_message_text if query else update.message.reply_text)(
+            "❌ No messages to forward!"
+        )
+        return
+
+    # Every (group, topic) pair is a destination (None topic means general chat)
+    destinations = [
+        (group_id, topic_id)
+        for group_id in session.selected_groups
+        for topic_id in session.selected_topics.get(group_id, {None})
+    ]
+    if session.schedule:
+        await schedule_prepared_job(update, session, destinations)
+        return
+    
+    excluded = await preflight(context.bot, destinations)
+    job_id = outbox.create_job(
+        update.effective_chat.id,
+        session.messages_to_forward,
+        destinations,
+        {group_id: session.groups_info[group_id] for group_id in session.selected_groups},
+        skip_duplicates=skips_duplicates(session),
+        excluded=excluded
+    )
+    
+    # Reset the session, the job now lives in the outbox
+    session.reset()
+    
+    text = f"🚀 Forwarding job #{job_id} started...\n"
+    if excluded:
+        text += f"⛔ {len(excluded)} unreachable destinations left out, see the report.\n"
+    status_msg = await (query.edit_message_text if query else update.message.reply_text)(
+        text + "Use /status to check on it or /cancel to stop it."
+    )
+    job = ForwardJob(job_id, update.effective_user.id, update.effective_chat.id, status_msg.message_id)
+    job_registry.start(job, execute_job(context.bot, job))
+
+def describe_schedule(run_at: float, interval: Optional[float]) -> str:
+    text = format_time(run_at)
+    if interval:
+        text += f", then every {format_duration(interval)}"
+    return text
+
+async def schedule_prepared_job(update: Update, session: Session, destinations: List[Destination]) -> None:
+    """Store the prepared job as a schedule instead of starting it"""
+    run_at, interval = session.schedule
+    schedule_id = outbox.create_schedule(
+        update.effective_chat.id,
+        session.messages_to_forward,
+        destinations,
+        {group_id: session.groups_info[group_id] for group_id in session.selected_groups},
+        # A recurring job is meant to post the same content every time
+        skips_duplicates(session) and not interval,
+        run_at,
+        interval
+    )
+    scheduler.add(schedule_id, run_at, len(session.messages_to_forward) * len(destinations))
+    session.reset()
+    
+    query = update.callback_query
+    await (query.edit_message_text if query else update.message.reply_text)(
+        f"⏰ Scheduled job #{schedule_id} for {describe_schedule(run_at, interval)}.\n"
+        f"Use /schedules to list scheduled jobs or /unschedule {schedule_id} to drop it."
+    )
+
+async def dispatch_schedule(bot, schedule_id: int) -> None:
+    """Start the forwarding job of a due schedule and queue its next run"""
+    schedule = outbox.get_schedule(schedule_id)
+    if schedule is None or schedule.status != 'active':
+        return
+    
+    excluded = await preflight(bot, schedule.destinations)
+    next_run = next_occurrence(schedule.run_at, schedule.interval, time.time())
+    job_id = outbox.create_scheduled_job(schedule, next_run, excluded)
+    if job_id is None:
+        # Dropped with /unschedule while the destinations were checked
+        return
+    if next_run is not None:
+        scheduler.add(schedule_id, next_run, schedule.size)
+    logger.info(f"Scheduled job {schedule_id} started as forwarding job {job_id}")
+    
+    text = f"⏰ Scheduled job #{schedule_id} started as forwarding job #{job_id}...\n"
+    if next_run is not None:
+        text += f"Next run: {format_time(next_run)}\n"
+    if excluded:
+        text += f"⛔ {len(excluded)} unreachable destinations left out, see the report.\n"
+    try:
+        status_msg = await bot.send_message(
+            chat_id=schedule.chat_id,
+            text=text + "Use /status to check on it or /cancel to stop it."
+        )
+    except Exception as e:
+        # The job stays unfinished in the outbox and is resumed on the next start
+        logger.error(f"Announcing forwarding job {job_id} failed: {e}")
+        return
+    
+    job = ForwardJob(job_id, schedule.chat_id, schedule.chat_id, status_msg.message_id)
+    job_registry.start(job, execute_job(bot, job))
+
+async def sync_channel_post(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Queue a new post of the sync source channel"""
+    post = update.channel_post
+    if post.text or post.photo or post.video or post.document:
+        record = MessageRecord.from_message(post)
+    else:
+        # Anything else (polls, stickers, voice...) is copied from the channel
+        record = MessageRecord('copy', source_chat_id=post.chat_id, source_message_id=post.message_id)
+    channel_sync.add(post.message_id, record)
+
+async def start_sync_job(bot, records: List[MessageRecord], destinations: List[Destination],
+                         message_id: int) -> None:
+    """Queue new channel posts in the outbox and send them like any other job"""
+    excluded = await preflight(bot, destinations)
+    groups_info = metadata_cache.groups_info(group_id for group_id, _ in destinations)
+    job_id = outbox.create_sync_job(
+        channel_sync.source_chat_id,
+        records,
+        destinations,
+        {group_id: groups_info.get(group_id, {'name': str(group_id), 'topics': {}}) for group_id, _ in destinations},
+        message_id,
+        excluded=excluded
+    )
+    job = ForwardJob(job_id, SYNC_CHAT_ID, SYNC_CHAT_ID, 0)
+    job_registry.start(job, execute_sync_job(bot, job))
+
+async def execute_sync_job(bot, job: ForwardJob) -> None:
+    """Run a channel sync job; without a status message its outcome is logged"""
+    try:
+        await run_forward_job(bot, job.job_id, job.progress)
+    except Exception as e:
+        logger.error(f"Sync job {job.job_id} failed: {e}")
+        return
+    progress = job.progress
+    logger.info(f"Sync job {job.job_id} done: {progress.sent} sent, {progress.failed} failed")
+
+async def prepare_manifest_job(bot, manifest: Manifest, chat_id: int) -> int:
+    """Check a manifest against the group metadata and queue it in the outbox"""
+    await metadata_cache.refresh(bot, Config.GROUP_IDS)
+    groups_info = metadata_cache.groups_info(Config.GROUP_IDS)
+    topic_groups = {
+        group_id for group_id, topic_id in manifest.destinations
+        if topic_id is not None and group_id in groups_info
+    }
+    if topic_groups:
+        for group_id, topics in metadata_cache.get_topics(topic_groups).items():
+            groups_info[group_id]['topics'] = topics
+    
+    problems = validate_destinations(manifest, groups_info)
+    if problems:
+        raise ManifestError("; ".join(problems))
+    
+    skip_duplicates = Config.SKIP_DUPLICATES if manifest.skip_duplicates is None else manifest.skip_duplicates
+    return outbox.create_job(
+        chat_id,
+        manifest.messages,
+        manifest.destinations,
+        {group_id: groups_info[group_id] for group_id, _ in manifest.destinations},
+        skip_duplicates=skip_duplicates,
+        excluded=await preflight(bot, manifest.destinations)
+    )
+
+async def run_manifest(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Start a job from a manifest file replied to, or JSON given after the command"""
+    if update.effective_user.id not in Config.AUTHORIZED_USER_IDS:
+        return
+    
+    message = update.message
+    source = message.reply_to_message
+    try:
+        if source and source.document:
+            manifest_file = await context.bot.get_file(source.document.file_id)
+            text = (await manifest_file.download_as_bytearray()).decode('utf-8')
+            data = load_manifest(text, source.document.file_name or "")
+        else:
+            text = message.text.partition(' ')[2].strip()
+            if not text:
+                await message.reply_text(
+                    "📄 Reply /manifest to a JSON or YAML manifest file, "
+                    "or send /manifest followed by the JSON manifest."
+                )
+                return
+            data = load_manifest(text)
+        job_id = await prepare_manifest_job(context.bot, parse_manifest(data), update.effective_chat.id)
+    except (ManifestError, UnicodeDecodeError) as e:
+        await message.reply_text(f"❌ Invalid manifest: {e}")
+        return
+    
+    status_msg = await message.reply_text(
+        f"🚀 Forwarding job #{job_id} started from manifest...\n"
+        "Use /status to check on it or /cancel to stop it."
+    )
+    job = ForwardJob(job_id, update.effective_user.id, update.effective_chat.id, status_msg.message_id)
+    job.jsonl_report = True
+    job_registry.start(job, execute_job(context.bot, job))
+
+async def status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if update.effective_user.id not in Config.AUTHORIZED_USER_IDS:
+        return
+    
+    jobs = job_registry.running(update.effective_user.id)
+    if not jobs:
+        await update.message.reply_text("💤 No forwarding jobs running.")
+        return
+    
+    await update.message.reply_text("\n\n".join(format_progress(job) for job in jobs))
+
+async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Cancel the job given as argument, or every running job of the user"""
+    if update.effective_user.id not in Config.AUTHORIZED_USER_IDS:
+        return
+    
+    if context.args:
+        try:
+            job_ids = [int(context.args[0].lstrip('#'))]
+        except ValueError:
+            await update.message.reply_text("❌ Usage: /cancel [job id]")
+            return
+    else:
+        job_ids = [job.job_id for job in job_registry.running(update.effective_user.id)]
     
-    # Reset bot state
-    bot_data.reset()
+    cancelled = [job_id for job_id in job_ids if job_registry.cancel(job_id, update.effective_user.id)]
+    if cancelled:
+        await update.message.reply_text(
+            f"⛔ Cancelling job(s): {', '.join(f'#{job_id}' for job_id in cancelled)}"
+        )
+    else:
+        await update.message.reply_text("💤 No matching forwarding job is running.")
+
+SCHEDULE_USAGE = (
+    "⏰ Usage: /schedule <when> [every <interval>]\n"
+    "e.g. /schedule 23:30, /schedule in 2h, /schedule 2025-01-31 08:00 every 1d\n"
+    "Times are server time. /schedule off forwards right away again."
+)
+
+async def schedule_job(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Make Finish & Forward schedule the prepared job instead of starting it"""
+    if update.effective_user.id not in Config.AUTHORIZED_USER_IDS:
+        return
+    
+    session = sessions.get(update.effective_user.id)
+    text = " ".join(context.args)
+    if not text:
+        await update.message.reply_text(SCHEDULE_USAGE)
+        return
+    if text.lower() == "off":
+        session.schedule = None
+        await update.message.reply_text("✅ Finish & Forward starts the job right away again.")
+        return
     
-    await (query.edit_message_text if query else update.message.reply_text)(report)
+    try:
+        session.schedule = parse_when(text)
+    except ValueError as e:
+        await update.message.reply_text(f"❌ {e}\n\n{SCHEDULE_USAGE}")
+        return
+    await update.message.reply_text(
+        f"⏰ Finish & Forward will schedule this job for {describe_schedule(*session.schedule)}.\n"
+        "Send /schedule off to forward right away instead."
+    )
+
+async def list_schedules(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if update.effective_user.id not in Config.AUTHORIZED_USER_IDS:
+        return
+    
+    schedules = outbox.active_schedules(update.effective_chat.id)
+    if not schedules:
+        await update.message.reply_text("💤 No scheduled jobs.")
+        return
+    
+    lines = [
+        f"⏰ #{schedule_id}: {describe_schedule(run_at, interval)} ({size} deliveries)"
+        for schedule_id, run_at, interval, size in schedules
+    ]
+    await update.message.reply_text("\n".join(lines))
+
+async def unschedule(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if update.effective_user.id not in Config.AUTHORIZED_USER_IDS:
+        return
+    
+    try:
+        schedule_id = int(context.args[0].lstrip('#'))
+    except (IndexError, ValueError):
+        await update.message.reply_text("❌ Usage: /unschedule <schedule id>")
+        return
+    
+    if outbox.finish_schedule(schedule_id, 'cancelled', update.effective_chat.id):
+        scheduler.remove(schedule_id)
+        await update.message.reply_text(f"🗑 Scheduled job #{schedule_id} dropped.")
+    else:
+        await update.message.reply_text("💤 No matching scheduled job.")
+
+async def resume_job(bot, job_id: int) -> None:
+    chat_id, _ = outbox.job_info(job_id)
+    logger.info(f"Resuming forwarding job {job_id}")
+    if chat_id == SYNC_CHAT_ID:
+        job = ForwardJob(job_id, SYNC_CHAT_ID, SYNC_CHAT_ID, 0)
+        job_registry.start(job, execute_sync_job(bot, job))
+        return
+    
+    try:
+        status_msg = await bot.send_message(
+            chat_id=chat_id,
+            text=f"♻️ Resuming forwarding job #{job_id} after a restart..."
+        )
+    except Exception as e:
+        logger.error(f"Resuming job {job_id} failed: {e}")
+        return
+    
+    # Jobs are started from the operator's private chat, whose id is the user id
+    job = ForwardJob(job_id, chat_id, chat_id, status_msg.message_id)
+    job_registry.start(job, execute_job(bot, job))
+
+async def resume_unfinished_jobs(application: Application) -> None:
+    """Pick up jobs that were interrupted by a crash or restart"""
+    for job_id in outbox.unfinished_jobs():
+        await resume_job(application.bot, job_id)
+
+async def start_senders() -> None:
+    """Initialize the extra sender bots, dropping those whose token is rejected"""
+    results = await asyncio.gather(
+        *(sender.bot.initialize() for sender in extra_senders), return_exceptions=True
+    )
+    for sender, result in list(zip(extra_senders, results)):
+        if isinstance(result, Exception):
+            logger.error(f"Sender bot {sender.name} unavailable: {result}")
+            extra_senders.remove(sender)
+    if extra_senders:
+        logger.info(f"📨 Sending with {len(extra_senders) + 1} bot tokens")
+
+async def post_init(application: Application) -> None:
+    if metrics:
+        await metrics.serve(Config.METRICS_HOST, Config.METRICS_PORT)
+    await start_senders()
+    await resume_unfinished_jobs(application)
+    start_scheduler(application)
+    if channel_sync:
+        channel_sync.start(
+            lambda records, destinations, message_id: start_sync_job(application.bot, records, destinations, message_id)
+        )
+    if Config.COMPACT_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(maintain_outbox()))
+
+def start_scheduler(application: Application) -> None:
+    """Queue the stored schedules; runs missed while down start right away"""
+    for schedule_id, run_at, _, size in outbox.active_schedules():
+        scheduler.add(schedule_id, run_at, size)
+    background_tasks.append(
+        scheduler.start(lambda schedule_id: dispatch_schedule(application.bot, schedule_id))
+    )
+
+async def maintain_outbox() -> None:
+    """Periodically expire the delivery index and drop old finished jobs"""
+    while True:
+        # Compaction blocks the event loop, so leave it for idle moments
+        if not job_registry.running():
+            try:
+                expired, removed = outbox.compact(Config.DELIVERED_TTL, Config.JOB_RETENTION)
+                if expired or removed:
+                    logger.info(f"🧹 Outbox compacted: {expired} index entries expired, {removed} jobs removed")
+            except Exception as e:
+                logger.error(f"Outbox compaction failed: {e}")
+        await asyncio.sleep(Config.COMPACT_INTERVAL)
+
+async def drain_jobs(application: Application) -> None:
+    """Give running jobs a chance to finish before the bot shuts down"""
+    for task in background_tasks:
+        task.cancel()
+    if channel_sync:
+        # Buffered posts become jobs, which resume after the restart if need be
+        await channel_sync.flush()
+    await job_registry.drain(Config.DRAIN_TIMEOUT)
+
+async def stop_senders(application: Application) -> None:
+    for sender in extra_senders:
+        await sender.bot.shutdown()
+
+def create_request(name: str, pool_size: int) -> PooledRequest:
+    return PooledRequest(
+        name,
+        pool_size,
+        keepalive_expiry=Config.HTTP_KEEPALIVE,
+        connect_timeout=Config.HTTP_CONNECT_TIMEOUT,
+        read_timeout=Config.HTTP_READ_TIMEOUT,
+        write_timeout=Config.HTTP_WRITE_TIMEOUT,
+        pool_timeout=Config.HTTP_POOL_TIMEOUT,
+        http_version=Config.HTTP_VERSION
+    )
+
+def create_bot(token: str, request: PooledRequest, get_updates_request: Optional[PooledRequest] = None) -> ExtBot:
+    if metrics:
+        return InstrumentedBot(token, request=request, get_updates_request=get_updates_request, metrics=metrics)
+    return ExtBot(token, request=request, get_updates_request=get_updates_request)
+
+def create_sender(token: str, index: int) -> Sender:
+    # Each token gets its own HTTP connection pool, sized for the fan-out
+    bot = create_bot(token, create_request(f"sender-{index}", Config.HTTP_POOL_SIZE))
+    limiter = RateLimiter(Config.GLOBAL_RATE_LIMIT, Config.CHAT_RATE_LIMIT, Config.CHAT_BURST)
+    return Sender(bot, limiter, f"sender-{index}")
+
+async def run_manifest_cli(path: str, chat_id: int) -> int:
+    """Run a manifest job to completion, printing its report as JSON lines"""
+    try:
+        if path == '-':
+            text = sys.stdin.read()
+        else:
+            with open(path, encoding='utf-8') as manifest_file:
+                text = manifest_file.read()
+        manifest = parse_manifest(load_manifest(text, path))
+    except (OSError, ManifestError) as e:
+        print(json.dumps({'event': 'error', 'error': str(e)}))
+        return 2
+
+    bot = create_bot(Config.TOKEN, create_request("send", Config.HTTP_POOL_SIZE))
+    async with bot:
+        await start_senders()
+        try:
+            try:
+                job_id = await prepare_manifest_job(bot, manifest, chat_id)
+            except ManifestError as e:
+                print(json.dumps({'event': 'error', 'error': str(e)}))
+                return 2
+            # An interrupted job stays in the outbox and is resumed by the bot
+            results = await run_forward_job(bot, job_id)
+        finally:
+            await stop_senders(None)
+
+    lines = report_lines(job_id, results)
+    for line in lines:
+        print(json.dumps(line, ensure_ascii=False))
+    return 1 if lines[-1]['failed'] else 0
+
+async def upload_directory_cli(directory: str, staging_chat_id: int) -> int:
+    """Upload a directory and print the manifest messages that reuse the file_ids"""
+    path = Path(directory)
+    if not path.is_dir():
+        print(json.dumps({'event': 'error', 'error': f"{directory} is not a directory"}))
+        return 2
+
+    bot = create_bot(Config.TOKEN, create_request("send", Config.HTTP_POOL_SIZE))
+    async with bot:
+        results = await create_uploader(bot, staging_chat_id).upload_all(list_files(path))
+
+    messages = []
+    for result in results:
+        if result.error:
+            logger.error(f"❌ {result.path}: {result.error}")
+            continue
+        messages.append({
+            'type': result.record.type,
+            'file_id': result.record.file_id,
+            'file_unique_id': result.record.file_unique_id
+        })
+    print(json.dumps({'messages': messages, 'destinations': []}, indent=2, ensure_ascii=False))
+    return 1 if len(messages) < len(results) else 0
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Telegram forwarding bot")
+    commands = parser.add_subparsers(dest="command")
+    run = commands.add_parser("run", help="run a job manifest without the interactive flow and exit")
+    run.add_argument("manifest", help="JSON or YAML manifest file, - to read JSON from stdin")
+    run.add_argument(
+        "--chat-id", type=int, default=Config.AUTHORIZED_USER_ID,
+        help="chat notified if the job has to be resumed by the bot (default: AUTHORIZED_USER_ID)"
+    )
+    upload = commands.add_parser("upload", help="upload a local directory once and print a manifest skeleton")
+    upload.add_argument("directory")
+    upload.add_argument(
+        "--staging-chat", type=int, default=Config.STAGING_CHAT_ID or Config.AUTHORIZED_USER_ID,
+        help="chat the files are uploaded to (default: STAGING_CHAT_ID, else AUTHORIZED_USER_ID)"
+    )
+    return parser.parse_args()
 
 def main() -> None:
+    args = parse_args()
+
     # Verify configuration
     if not Config.TOKEN:
         logger.error("❌ TELEGRAM_BOT_TOKEN not set in environment variables!")
         exit(1)
     
-    if Config.AUTHORIZED_USER_ID == 0:
-        logger.error("❌ AUTHORIZED_USER_ID not set or invalid!")
+    if not Config.AUTHORIZED_USER_IDS:
+        logger.error("❌ AUTHORIZED_USER_ID / AUTHORIZED_USER_IDS not set or invalid!")
         exit(1)
 
     if not Config.GROUP_IDS:
         logger.error("❌ No GROUP_IDS configured in environment variables!")
         exit(1)
 
+    if Config.SYNC_SOURCE_CHAT_ID and not Config.SYNC_DESTINATIONS:
+        logger.error("❌ SYNC_SOURCE_CHAT_ID is set but SYNC_DESTINATIONS is invalid or empty!")
+        exit(1)
+
+    if Config.UPDATE_MODE == "webhook" and not Config.WEBHOOK_URL:
+        logger.error("❌ UPDATE_MODE is webhook but WEBHOOK_URL is not set!")
+        exit(1)
+
+    # Handlers trust the sender in the update, so only Telegram may post them
+    if Config.UPDATE_MODE == "webhook" and not Config.WEBHOOK_SECRET:
+        logger.error("❌ UPDATE_MODE is webhook but WEBHOOK_SECRET is not set!")
+        exit(1)
+
+    extra_senders.extend(create_sender(token, index) for index, token in enumerate(Config.SENDER_TOKENS, 1))
+
+    if args.command == "run":
+        exit(asyncio.run(run_manifest_cli(args.manifest, args.chat_id)))
+    if args.command == "upload":
+        exit(asyncio.run(upload_directory_cli(args.directory, args.staging_chat)))
+
     # Create application
-    application = Application.builder().token(Config.TOKEN).build()
+    builder = (
+        Application.builder()
+        .post_init(post_init)
+        .post_stop(drain_jobs)
+        .post_shutdown(stop_senders)
+        .concurrent_updates(Config.CONCURRENT_UPDATES)
+    )
+    # Long polling holds its connection for the whole poll, keep it out of the send pool
+    application = builder.bot(create_bot(
+        Config.TOKEN, create_request("send", Config.HTTP_POOL_SIZE), create_request("updates", 1)
+    )).build()
     
     # Add handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("done", done))
     application.add_handler(CommandHandler("refresh", refresh_groups))
+    application.add_handler(CommandHandler("status", status))
+    application.add_handler(CommandHandler("cancel", cancel))
+    application.add_handler(CommandHandler("manifest", run_manifest))
+    application.add_handler(CommandHandler("upload", upload_directory))
+    application.add_handler(CommandHandler("schedule", schedule_job))
+    application.add_handler(CommandHandler("schedules", list_schedules))
+    application.add_handler(CommandHandler("unschedule", unschedule))
+    application.add_handler(ChatMemberHandler(track_membership, ChatMemberHandler.MY_CHAT_MEMBER))
+    application.add_handler(MessageHandler(
+        filters.StatusUpdate.FORUM_TOPIC_CREATED |
+        filters.StatusUpdate.FORUM_TOPIC_EDITED |
+        filters.StatusUpdate.FORUM_TOPIC_CLOSED |
+        filters.StatusUpdate.FORUM_TOPIC_REOPENED,
+        track_topics
+    ))
+    if channel_sync:
+        application.add_handler(MessageHandler(
+            filters.UpdateType.CHANNEL_POST &
+            filters.Chat(Config.SYNC_SOURCE_CHAT_ID) &
+            ~filters.StatusUpdate.ALL,
+            sync_channel_post
+        ))
     
     application.add_handler(MessageHandler(
         filters.ChatType.PRIVATE & 
@@ -492,19 +1484,41 @@ def main() -> None:
     application.add_handler(CallbackQueryHandler(start_process, pattern="^start_process$"))
     application.add_handler(CallbackQueryHandler(refresh_groups, pattern="^refresh_groups$"))
     application.add_handler(CallbackQueryHandler(select_groups, pattern="^select_groups$"))
+    application.add_handler(CallbackQueryHandler(groups_page, pattern="^groups_page:"))
     application.add_handler(CallbackQueryHandler(toggle_group, pattern="^toggle_group:"))
     application.add_handler(CallbackQueryHandler(select_all_groups, pattern="^select_all_groups$"))
     application.add_handler(CallbackQueryHandler(deselect_all_groups, pattern="^deselect_all_groups$"))
     application.add_handler(CallbackQueryHandler(confirm_send, pattern="^confirm_send$"))
     application.add_handler(CallbackQueryHandler(show_topic_selection, pattern="^select_topics:"))
+    application.add_handler(CallbackQueryHandler(topics_page, pattern="^topics_page:"))
     application.add_handler(CallbackQueryHandler(toggle_topic, pattern="^toggle_topic:"))
     application.add_handler(CallbackQueryHandler(select_all_topics, pattern="^select_all_topics:"))
     application.add_handler(CallbackQueryHandler(deselect_all_topics, pattern="^deselect_all_topics:"))
+    application.add_handler(CallbackQueryHandler(start_search, pattern="^search:"))
+    application.add_handler(CallbackQueryHandler(clear_search, pattern="^clear_search:"))
+    application.add_handler(CallbackQueryHandler(toggle_duplicates, pattern="^toggle_duplicates$"))
+    application.add_handler(CallbackQueryHandler(noop, pattern="^noop$"))
     application.add_handler(CallbackQueryHandler(forward_messages, pattern="^forward_messages$"))
     
+    if metrics:
+        instrument_handlers(application, metrics)
+    
     # Run bot
-    logger.info("🤖 Bot is running...")
-    application.run_polling()
+    if Config.UPDATE_MODE == "webhook":
+        asyncio.run(run_webhook(
+            application,
+            listen=Config.WEBHOOK_LISTEN,
+            port=Config.WEBHOOK_PORT,
+            path=Config.WEBHOOK_PATH,
+            webhook_url=Config.WEBHOOK_URL,
+            secret_token=Config.WEBHOOK_SECRET,
+            cert=Config.WEBHOOK_CERT or None,
+            key=Config.WEBHOOK_KEY or None,
+            max_connections=Config.WEBHOOK_MAX_CONNECTIONS
+        ))
+    else:
+        logger.info("🤖 Bot is running...")
+        application.run_polling()
 
 if __name__ == "__main__":
     main()
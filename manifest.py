@@ -0,0 +1,142 @@
+"""Job manifests for running forwarding jobs without the interactive flow.
+
+A manifest is a JSON (or, with PyYAML installed, YAML) document:
+
+    {
+      "messages": [
+        {"text": "Weekly update"},
+        {"type": "photo", "file_id": "AgAC...", "caption": "Chart", "media_group_id": "a"},
+        {"type": "document", "file_id": "BQAC..."},
+        {"chat_id": -1001234567890, "message_id": 42}
+      ],
+      "destinations": [
+        {"group_id": -1001111111111},
+        {"group_id": -1002222222222, "topic_ids": [5, 7]}
+      ],
+      "skip_duplicates": true
+    }
+
+Messages are texts, media by file_id, or existing messages copied by
+chat and message id. A destination without topics is the group's general
+chat.
+"""
+import json
+from typing import Dict, List, Optional
+
+from outbox import Destination
+from records import MessageRecord
+
+MEDIA_TYPES = ('photo', 'video', 'document')
+
+
+class ManifestError(ValueError):
+    """The manifest cannot be parsed or does not match the known groups"""
+
+
+class Manifest:
+    def __init__(self, messages: List[MessageRecord], destinations: List[Destination],
+                 skip_duplicates: Optional[bool] = None):
+        self.messages = messages
+        self.destinations = destinations
+        self.skip_duplicates = skip_duplicates
+
+
+def load_manifest(text: str, name: str = "") -> Dict:
+    """Decode a manifest document, as YAML when `name` says so"""
+    if name.endswith(('.yaml', '.yml')):
+        try:
+            import yaml
+        except ImportError:
+            raise ManifestError("YAML manifests need PyYAML installed (pip install pyyaml)")
+        try:
+            data = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise ManifestError(f"Invalid YAML: {e}")
+    else:
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise ManifestError(f"Invalid JSON: {e}")
+    if not isinstance(data, dict):
+        raise ManifestError("The manifest must be an object with messages and destinations")
+    return data
+
+
+def _parse_message(index: int, item) -> MessageRecord:
+    if not isinstance(item, dict):
+        raise ManifestError(f"messages[{index}] must be an object")
+    if 'message_id' in item:
+        try:
+            return MessageRecord(
+                'copy', source_chat_id=int(item['chat_id']), source_message_id=int(item['message_id'])
+            )
+        except (KeyError, TypeError, ValueError):
+            raise ManifestError(f"messages[{index}] needs an integer chat_id and message_id to copy")
+
+    msg_type = item.get('type', 'text' if 'text' in item else None)
+    if msg_type == 'text':
+        if not item.get('text'):
+            raise ManifestError(f"messages[{index}] has no text")
+        return MessageRecord('text', text=str(item['text']))
+    if msg_type in MEDIA_TYPES:
+        if not item.get('file_id'):
+            raise ManifestError(f"messages[{index}] is a {msg_type} without file_id")
+        return MessageRecord(
+            msg_type,
+            file_id=item['file_id'],
+            file_unique_id=item.get('file_unique_id'),
+            caption=item.get('caption'),
+            media_group_id=item.get('media_group_id')
+        )
+    raise ManifestError(f"messages[{index}] has unknown type {msg_type!r}")
+
+
+def _parse_destinations(index: int, item) -> List[Destination]:
+    if not isinstance(item, dict):
+        raise ManifestError(f"destinations[{index}] must be an object")
+    try:
+        group_id = int(item['group_id'])
+        topic_ids = item.get('topic_ids')
+        if topic_ids is None and 'topic_id' in item:
+            topic_ids = [item['topic_id']]
+        if not topic_ids:
+            return [(group_id, None)]
+        return [(group_id, int(topic_id)) for topic_id in topic_ids]
+    except (KeyError, TypeError, ValueError):
+        raise ManifestError(f"destinations[{index}] needs an integer group_id and integer topic ids")
+
+
+def parse_manifest(data: Dict) -> Manifest:
+    messages = data.get('messages')
+    destinations = data.get('destinations')
+    if not isinstance(messages, list) or not messages:
+        raise ManifestError("The manifest lists no messages")
+    if not isinstance(destinations, list) or not destinations:
+        raise ManifestError("The manifest lists no destinations")
+
+    records = [_parse_message(index, item) for index, item in enumerate(messages)]
+    # Keep the listed order but drop repeated destinations
+    targets: Dict[Destination, None] = {}
+    for index, item in enumerate(destinations):
+        for destination in _parse_destinations(index, item):
+            targets[destination] = None
+
+    skip_duplicates = data.get('skip_duplicates')
+    if skip_duplicates is not None and not isinstance(skip_duplicates, bool):
+        raise ManifestError("skip_duplicates must be true or false")
+    return Manifest(records, list(targets), skip_duplicates)
+
+
+def validate_destinations(manifest: Manifest, groups_info: Dict[int, Dict]) -> List[str]:
+    """Problems with the destinations given the cached group and topic metadata.
+
+    Topics are only checked for groups whose topic list is known.
+    """
+    problems = []
+    for group_id, topic_id in manifest.destinations:
+        group_info = groups_info.get(group_id)
+        if group_info is None:
+            problems.append(f"Group {group_id} is not a configured group where the bot is admin")
+        elif topic_id is not None and group_info.get('topics') and topic_id not in group_info['topics']:
+            problems.append(f"Topic {topic_id} does not exist in {group_info['name']} ({group_id})")
+    return problems
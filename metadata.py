@@ -0,0 +1,191 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional, TypeVar
+
+from telegram.error import BadRequest, Forbidden
+
+from fanout import Destination
+
+logger = logging.getLogger(__name__)
+
+V = TypeVar('V')
+
+
+def int_keys(mapping: Dict[str, V]) -> Dict[int, V]:
+    """Undo JSON turning integer keys (group and topic ids) into strings"""
+    return {int(key): value for key, value in mapping.items()}
+
+
+def _posting_problem(chat_member) -> Optional[str]:
+    """Why the bot cannot post with this membership, None if it can"""
+    if chat_member.status in ('left', 'kicked'):
+        return "bot is not a member of the group"
+    if chat_member.status == 'restricted' and not getattr(chat_member, 'can_send_messages', True):
+        return "bot may not send messages"
+    if chat_member.status == 'administrator' and getattr(chat_member, 'can_post_messages', None) is False:
+        return "bot may not post messages"
+    return None
+
+
+class MetadataCache:
+    """Group and forum topic metadata, fetched concurrently and kept with a TTL.
+
+    Entries are persisted to a JSON file so a restart starts warm. A refresh
+    only re-queries groups that are missing, stale or were invalidated (for
+    example because the bot's membership changed). Besides names, entries
+    keep why the bot cannot post to a group and which topics are closed,
+    so dead destinations can be left out before sending.
+    """
+
+    def __init__(self, path: str, ttl: float, concurrency: int):
+        self.path = path
+        self.ttl = ttl
+        self.semaphore = asyncio.Semaphore(max(concurrency, 1))
+        self.entries: Dict[int, Dict] = {}
+        self.refresh_task: Optional[asyncio.Task] = None
+        self.load()
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable metadata cache {self.path}: {e}")
+            return
+
+        for group_id, entry in int_keys(data).items():
+            if entry.get('topics') is not None:
+                entry['topics'] = int_keys(entry['topics'])
+            entry.setdefault('closed_topics', [])
+            self.entries[group_id] = entry
+
+    def save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save metadata cache {self.path}: {e}")
+
+    def _is_fresh(self, fetched_at: Optional[float]) -> bool:
+        return fetched_at is not None and time.time() - fetched_at < self.ttl
+
+    def groups_info(self, group_ids: Iterable[int]) -> Dict[int, Dict]:
+        """Cached groups where the bot is admin, in `group_ids` order"""
+        groups_info = {}
+        for group_id in group_ids:
+            entry = self.entries.get(group_id)
+            if entry and entry['is_admin']:
+                groups_info[group_id] = {
+                    'name': entry['name'],
+                    'topics': dict(entry.get('topics') or {})
+                }
+        return groups_info
+
+    def stale_groups(self, group_ids: Iterable[int]) -> List[int]:
+        return [
+            group_id for group_id in group_ids
+            if not self._is_fresh(self.entries.get(group_id, {}).get('fetched_at'))
+        ]
+
+    def invalidate(self, group_id: int) -> None:
+        """Force the next refresh to re-query a group"""
+        entry = self.entries.get(group_id)
+        if entry:
+            entry['fetched_at'] = None
+
+    async def _fetch_group(self, bot, group_id: int) -> None:
+        async with self.semaphore:
+            try:
+                chat, chat_member = await asyncio.gather(
+                    bot.get_chat(group_id),
+                    bot.get_chat_member(chat_id=group_id, user_id=bot.id)
+                )
+            except (BadRequest, Forbidden) as e:
+                # Telegram's final word: the bot cannot reach this chat any more
+                logger.warning(f"Group {group_id} is unreachable: {e}")
+                entry = self._entry(group_id)
+                entry.update(is_admin=False, problem=str(e), fetched_at=time.time())
+                return
+            except Exception as e:
+                # Keep whatever we knew before rather than dropping the group
+                logger.error(f"Error processing group {group_id}: {e}")
+                return
+
+        is_admin = chat_member.status in ['administrator', 'creator']
+        if not is_admin:
+            logger.warning(f"Bot is not admin in group {group_id}")
+
+        entry = self._entry(group_id)
+        entry.update(
+            name=chat.title, is_admin=is_admin, problem=_posting_problem(chat_member), fetched_at=time.time()
+        )
+
+    def _entry(self, group_id: int) -> Dict:
+        return self.entries.setdefault(group_id, {
+            'name': str(group_id), 'is_admin': True, 'fetched_at': None,
+            'topics': None, 'closed_topics': []
+        })
+
+    async def refresh(self, bot, group_ids: Iterable[int]) -> None:
+        """Re-query the missing and stale groups concurrently"""
+        stale = self.stale_groups(group_ids)
+        if not stale:
+            return
+        await asyncio.gather(*(self._fetch_group(bot, group_id) for group_id in stale))
+        self.save()
+
+    def refresh_in_background(self, bot, group_ids: Iterable[int]) -> None:
+        """Start a refresh unless one is already running"""
+        if self.refresh_task and not self.refresh_task.done():
+            return
+        self.refresh_task = asyncio.create_task(self.refresh(bot, list(group_ids)))
+
+    def get_topics(self, group_ids: Iterable[int]) -> Dict[int, Dict[int, str]]:
+        """Forum topics per group, as learned from their service messages.
+
+        The Bot API cannot list topics, so a group has only the topics the
+        bot saw being created or edited.
+        """
+        return {group_id: dict(self.entries.get(group_id, {}).get('topics') or {}) for group_id in group_ids}
+
+    def update_topic(self, group_id: int, topic_id: int, name: Optional[str] = None,
+                     closed: Optional[bool] = None) -> None:
+        """Apply a forum topic service message (created, edited, closed, reopened)"""
+        entry = self._entry(group_id)
+        if name is not None:
+            topics = dict(entry.get('topics') or {})
+            topics[topic_id] = name
+            entry['topics'] = topics
+        if closed is not None:
+            closed_topics = set(entry.get('closed_topics') or ())
+            if closed:
+                closed_topics.add(topic_id)
+            else:
+                closed_topics.discard(topic_id)
+            entry['closed_topics'] = sorted(closed_topics)
+        self.save()
+
+    def destination_problems(self, destinations: Iterable[Destination]) -> Dict[Destination, str]:
+        """Why destinations cannot be posted to, going by the cached metadata"""
+        problems = {}
+        for group_id, topic_id in destinations:
+            entry = self.entries.get(group_id)
+            if entry is None:
+                problem = "group is unknown"
+            elif entry.get('problem'):
+                problem = entry['problem']
+            elif not entry.get('is_admin'):
+                problem = "bot is no longer an admin"
+            elif topic_id is not None and topic_id in (entry.get('closed_topics') or ()):
+                problem = "topic is closed"
+            else:
+                continue
+            problems[(group_id, topic_id)] = problem
+        return problems
@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import re
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from telegram.ext import Application, ExtBot
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        labels = tuple(str(label) for label in labels)
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time"""
+
+    def __init__(self, name: str, help: str, read: Callable[[], float] = lambda: 0):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.read()}"]
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # Per label set: count in each bucket (last one is +Inf), then sum
+        self.values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        labels = tuple(str(label) for label in labels)
+        counts, total = self.values.setdefault(labels, ([0] * (len(self.buckets) + 1), [0.0]))
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total[0]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Metrics:
+    """Hot-path metrics of the bot, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self.api_latency = Histogram(
+            "bot_api_request_duration_seconds", "Latency of Bot API calls", ["method"]
+        )
+        self.api_requests = Counter(
+            "bot_api_requests_total", "Bot API calls by method, chat and outcome", ["method", "chat", "outcome"]
+        )
+        self.retries = Counter(
+            "forward_retries_total", "Sends retried by destination chat and reason", ["chat", "reason"]
+        )
+        self.handler_latency = Histogram(
+            "handler_duration_seconds", "Execution time of update handlers", ["handler"]
+        )
+        self.queue_depth = Gauge("forward_queue_depth", "Messages still pending in running jobs")
+
+    def render(self) -> str:
+        lines = []
+        for metric in (self.api_latency, self.api_requests, self.retries, self.handler_latency, self.queue_depth):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def time_handler(self, callback: Callable) -> Callable:
+        name = getattr(callback, '__name__', repr(callback))
+
+        async def timed(update, context):
+            started = time.perf_counter()
+            try:
+                return await callback(update, context)
+            finally:
+                self.handler_latency.observe(time.perf_counter() - started, name)
+
+        timed.__name__ = name
+        return timed
+
+    async def serve(self, host: str, port: int) -> asyncio.AbstractServer:
+        """Expose GET /metrics on a local plain HTTP server"""
+
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            try:
+                request_line = await reader.readline()
+                # Skip the headers, nothing in them matters here
+                while (await reader.readline()).strip():
+                    pass
+                parts = request_line.decode('latin-1').split()
+                if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                    status, body = "200 OK", self.render().encode()
+                else:
+                    status, body = "404 Not Found", b"Not Found\n"
+                writer.write(
+                    f"HTTP/1.1 {status}\r\n"
+                    "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    "Connection: close\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(handle, host, port)
+        logger.info(f"📈 Metrics available on http://{host}:{port}/metrics")
+        return server
+
+
+def _snake_case(endpoint: str) -> str:
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', endpoint).lower()
+
+
+class InstrumentedBot(ExtBot):
+    """ExtBot that records latency and outcome of every Bot API call"""
+
+    def __init__(self, *args, metrics: Metrics, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics = metrics
+
+    async def _do_post(self, endpoint: str, data, *args, **kwargs):
+        # Long polling would only drown the histograms
+        if endpoint == 'getUpdates':
+            return await super()._do_post(endpoint, data, *args, **kwargs)
+
+        method = _snake_case(endpoint)
+        chat = data.get('chat_id', '') if data else ''
+        started = time.perf_counter()
+        outcome = 'failure'
+        try:
+            result = await super()._do_post(endpoint, data, *args, **kwargs)
+            outcome = 'success'
+            return result
+        finally:
+            self._metrics.api_latency.observe(time.perf_counter() - started, method)
+            self._metrics.api_requests.inc(method, chat, outcome)
+
+
+def instrument_handlers(application: Application, metrics: Metrics) -> None:
+    """Time every registered handler callback"""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            handler.callback = metrics.time_handler(handler.callback)
@@ -0,0 +1,481 @@
+import json
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+from fanout import Destination
+from metadata import int_keys
+from records import MessageRecord
+
+PENDING = 'pending'
+SENT = 'sent'
+FAILED = 'failed'
+# Already delivered to the destination by an earlier job
+SKIPPED = 'skipped'
+# Left out because the destination is unreachable; the reason is kept as error
+EXCLUDED = 'excluded'
+
+# jobs.chat_id of channel sync jobs: they have no operator chat to report to
+SYNC_CHAT_ID = 0
+
+# Free pages compact() returns to the file system per run, bounding its work
+VACUUM_PAGES = 2000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER NOT NULL,
+    groups_info TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'running',
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_messages (
+    job_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    content_key TEXT,
+    PRIMARY KEY (job_id, position)
+);
+CREATE TABLE IF NOT EXISTS deliveries (
+    job_id INTEGER NOT NULL,
+    group_id INTEGER NOT NULL,
+    topic_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    error TEXT,
+    updated_at REAL,
+    PRIMARY KEY (job_id, group_id, topic_id, position)
+);
+CREATE INDEX IF NOT EXISTS deliveries_by_status ON deliveries (job_id, status);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status);
+CREATE TABLE IF NOT EXISTS delivered (
+    content_key TEXT NOT NULL,
+    group_id INTEGER NOT NULL,
+    topic_id INTEGER NOT NULL,
+    delivered_at REAL NOT NULL,
+    PRIMARY KEY (content_key, group_id, topic_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS delivered_by_age ON delivered (delivered_at);
+CREATE TABLE IF NOT EXISTS schedules (
+    schedule_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER NOT NULL,
+    messages TEXT NOT NULL,
+    destinations TEXT NOT NULL,
+    groups_info TEXT NOT NULL,
+    skip_duplicates INTEGER NOT NULL,
+    run_at REAL NOT NULL,
+    interval REAL,
+    status TEXT NOT NULL DEFAULT 'active',
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sync_cursors (
+    source_chat_id INTEGER NOT NULL,
+    group_id INTEGER NOT NULL,
+    topic_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (source_chat_id, group_id, topic_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sync_posts (
+    source_chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (source_chat_id, message_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS uploads (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    payload TEXT NOT NULL,
+    uploaded_at REAL NOT NULL
+);
+"""
+
+
+def _decode_groups_info(groups_info: str) -> Dict[int, Dict]:
+    return {
+        group_id: {'name': info['name'], 'topics': int_keys(info.get('topics') or {})}
+        for group_id, info in int_keys(json.loads(groups_info)).items()
+    }
+
+
+class Schedule:
+    """A prepared job to be started at `run_at`, again every `interval` seconds if set"""
+
+    def __init__(self, schedule_id: int, chat_id: int, messages: List[MessageRecord],
+                 destinations: List[Destination], groups_info: Dict[int, Dict], skip_duplicates: bool,
+                 run_at: float, interval: Optional[float], status: str):
+        self.schedule_id = schedule_id
+        self.chat_id = chat_id
+        self.messages = messages
+        self.destinations = destinations
+        self.groups_info = groups_info
+        self.skip_duplicates = skip_duplicates
+        self.run_at = run_at
+        self.interval = interval
+        self.status = status
+
+    @property
+    def size(self) -> int:
+        """Deliveries each run makes"""
+        return len(self.messages) * len(self.destinations)
+
+
+class Outbox:
+    """SQLite record of every (message, destination) delivery of a job.
+
+    Deliveries start as pending and are flipped to sent or failed as soon
+    as the send returns. After a restart only the pending rows are sent
+    again, so a job resumes where it stopped.
+
+    Sent deliveries are also recorded in a delivery index keyed by content
+    and destination, which later jobs consult to skip duplicates.
+    """
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        # Only takes effect on new files; older ones simply reuse freed pages
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(job_messages)")]
+        if 'content_key' not in columns:
+            # Outboxes created before the delivery index existed
+            self.conn.execute("ALTER TABLE job_messages ADD COLUMN content_key TEXT")
+        self.conn.commit()
+
+    def create_job(self, chat_id: int, messages: List[MessageRecord], destinations: List[Destination],
+                   groups_info: Dict[int, Dict], skip_duplicates: bool = True,
+                   excluded: Optional[Dict[Destination, str]] = None) -> int:
+        """Persist a new job with every delivery pending and return its id
+
+        With `skip_duplicates` deliveries found in the delivery index are
+        marked skipped right away instead of being sent again. Destinations
+        in `excluded` are kept with their reason but never sent to.
+        """
+        with self.conn:
+            return self._insert_job(chat_id, messages, destinations, groups_info, skip_duplicates, excluded)
+
+    def _insert_job(self, chat_id: int, messages: List[MessageRecord], destinations: List[Destination],
+                    groups_info: Dict[int, Dict], skip_duplicates: bool,
+                    excluded: Optional[Dict[Destination, str]]) -> int:
+        """create_job without its transaction, for callers that change more at once"""
+        cursor = self.conn.execute(
+            "INSERT INTO jobs (chat_id, groups_info, created_at) VALUES (?, ?, ?)",
+            (chat_id, json.dumps(groups_info), time.time())
+        )
+        job_id = cursor.lastrowid
+        self.conn.executemany(
+            "INSERT INTO job_messages (job_id, position, payload, content_key) VALUES (?, ?, ?, ?)",
+            (
+                (job_id, position, record.to_json(), record.content_key)
+                for position, record in enumerate(messages)
+            )
+        )
+        self.conn.executemany(
+            "INSERT INTO deliveries (job_id, group_id, topic_id, position) VALUES (?, ?, ?, ?)",
+            (
+                (job_id, group_id, topic_id or 0, position)
+                for group_id, topic_id in destinations
+                for position in range(len(messages))
+            )
+        )
+        self.conn.executemany(
+            "UPDATE deliveries SET status = ?, error = ?, updated_at = ? "
+            "WHERE job_id = ? AND group_id = ? AND topic_id = ?",
+            (
+                (EXCLUDED, reason, time.time(), job_id, group_id, topic_id or 0)
+                for (group_id, topic_id), reason in (excluded or {}).items()
+            )
+        )
+        if skip_duplicates:
+            self.conn.execute(
+                "UPDATE deliveries SET status = ?, updated_at = ? WHERE job_id = ? AND status = ? AND EXISTS ("
+                "SELECT 1 FROM job_messages m JOIN delivered d ON d.content_key = m.content_key "
+                "WHERE m.job_id = deliveries.job_id AND m.position = deliveries.position "
+                "AND d.group_id = deliveries.group_id AND d.topic_id = deliveries.topic_id)",
+                (SKIPPED, time.time(), job_id, PENDING)
+            )
+        return job_id
+
+    def unfinished_jobs(self) -> List[int]:
+        rows = self.conn.execute("SELECT job_id FROM jobs WHERE status = 'running' ORDER BY job_id")
+        return [job_id for job_id, in rows]
+
+    def job_info(self, job_id: int) -> Tuple[int, Dict[int, Dict]]:
+        """Report chat and group names of a job"""
+        chat_id, groups_info = self.conn.execute(
+            "SELECT chat_id, groups_info FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return chat_id, _decode_groups_info(groups_info)
+
+    def pending_plan(self, job_id: int) -> Dict[Destination, List[MessageRecord]]:
+        """Messages still to be delivered, per destination in job order"""
+        messages = {
+            position: MessageRecord.from_json(payload, position)
+            for position, payload in self.conn.execute(
+                "SELECT position, payload FROM job_messages WHERE job_id = ?", (job_id,)
+            )
+        }
+        plan: Dict[Destination, List[MessageRecord]] = {}
+        for group_id, topic_id in self.destinations(job_id):
+            plan[(group_id, topic_id)] = []
+
+        rows = self.conn.execute(
+            "SELECT group_id, topic_id, position FROM deliveries "
+            "WHERE job_id = ? AND status = ? ORDER BY position",
+            (job_id, PENDING)
+        )
+        for group_id, topic_id, position in rows:
+            plan[(group_id, topic_id or None)].append(messages[position])
+        return plan
+
+    def destinations(self, job_id: int) -> List[Destination]:
+        rows = self.conn.execute(
+            "SELECT group_id, topic_id FROM deliveries WHERE job_id = ? "
+            "GROUP BY group_id, topic_id ORDER BY MIN(rowid)",
+            (job_id,)
+        )
+        return [(group_id, topic_id or None) for group_id, topic_id in rows]
+
+    def mark(self, job_id: int, destination: Destination, positions: List[int],
+             status: str, error: Optional[str] = None) -> None:
+        """Settle pending deliveries; rows already settled are left alone"""
+        group_id, topic_id = destination
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE deliveries SET status = ?, error = ?, updated_at = ? "
+                "WHERE job_id = ? AND group_id = ? AND topic_id = ? AND position = ? AND status = ?",
+                (
+                    (status, error, now, job_id, group_id, topic_id or 0, position, PENDING)
+                    for position in positions
+                )
+            )
+            if status == SENT:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO delivered (content_key, group_id, topic_id, delivered_at) "
+                    "SELECT content_key, ?, ?, ? FROM job_messages "
+                    "WHERE job_id = ? AND position = ? AND content_key IS NOT NULL",
+                    ((group_id, topic_id or 0, now, job_id, position) for position in positions)
+                )
+
+    def counts(self, job_id: int) -> Dict[Destination, Dict[str, int]]:
+        """Delivery counts by status for every destination of a job"""
+        counts: Dict[Destination, Dict[str, int]] = {}
+        rows = self.conn.execute(
+            "SELECT group_id, topic_id, status, COUNT(*) FROM deliveries "
+            "WHERE job_id = ? GROUP BY group_id, topic_id, status",
+            (job_id,)
+        )
+        for group_id, topic_id, status, count in rows:
+            counts.setdefault((group_id, topic_id or None), {})[status] = count
+        return counts
+
+    def exclusions(self, job_id: int) -> Dict[Destination, str]:
+        """Reasons destinations of a job were left out"""
+        rows = self.conn.execute(
+            "SELECT group_id, topic_id, MAX(error) FROM deliveries "
+            "WHERE job_id = ? AND status = ? GROUP BY group_id, topic_id",
+            (job_id, EXCLUDED)
+        )
+        return {(group_id, topic_id or None): reason for group_id, topic_id, reason in rows}
+
+    def finish_job(self, job_id: int) -> None:
+        with self.conn:
+            self.conn.execute("UPDATE jobs SET status = 'done' WHERE job_id = ?", (job_id,))
+
+    def cancel_job(self, job_id: int) -> None:
+        """Stop a job for good; its pending deliveries are never resumed"""
+        with self.conn:
+            self.conn.execute("UPDATE jobs SET status = 'cancelled' WHERE job_id = ?", (job_id,))
+
+    def cached_upload(self, path: str, size: int, mtime: float) -> Optional[MessageRecord]:
+        """Record of a local file uploaded before, if it is unchanged since"""
+        row = self.conn.execute(
+            "SELECT payload FROM uploads WHERE path = ? AND size = ? AND mtime = ?", (path, size, mtime)
+        ).fetchone()
+        return MessageRecord.from_json(row[0]) if row else None
+
+    def store_upload(self, path: str, size: int, mtime: float, record: MessageRecord) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO uploads (path, size, mtime, payload, uploaded_at) VALUES (?, ?, ?, ?, ?)",
+                (path, size, mtime, record.to_json(), time.time())
+            )
+
+    def create_schedule(self, chat_id: int, messages: List[MessageRecord], destinations: List[Destination],
+                        groups_info: Dict[int, Dict], skip_duplicates: bool, run_at: float,
+                        interval: Optional[float] = None) -> int:
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO schedules (chat_id, messages, destinations, groups_info, skip_duplicates, "
+                "run_at, interval, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    chat_id,
+                    json.dumps([record.to_json() for record in messages]),
+                    json.dumps(destinations),
+                    json.dumps(groups_info),
+                    int(skip_duplicates),
+                    run_at,
+                    interval,
+                    time.time()
+                )
+            )
+        return cursor.lastrowid
+
+    def get_schedule(self, schedule_id: int) -> Optional[Schedule]:
+        row = self.conn.execute(
+            "SELECT schedule_id, chat_id, messages, destinations, groups_info, skip_duplicates, "
+            "run_at, interval, status FROM schedules WHERE schedule_id = ?",
+            (schedule_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        schedule_id, chat_id, messages, destinations, groups_info, skip_duplicates, run_at, interval, status = row
+        return Schedule(
+            schedule_id,
+            chat_id,
+            [MessageRecord.from_json(payload) for payload in json.loads(messages)],
+            [(group_id, topic_id) for group_id, topic_id in json.loads(destinations)],
+            _decode_groups_info(groups_info),
+            bool(skip_duplicates),
+            run_at,
+            interval,
+            status
+        )
+
+    def active_schedules(self, chat_id: Optional[int] = None) -> List[Tuple[int, float, Optional[float], int]]:
+        """Id, next run, interval and deliveries per run of the active schedules"""
+        query = (
+            "SELECT schedule_id, run_at, interval, json_array_length(messages) * json_array_length(destinations) "
+            "FROM schedules WHERE status = 'active'"
+        )
+        params: Tuple = ()
+        if chat_id is not None:
+            query += " AND chat_id = ?"
+            params = (chat_id,)
+        return self.conn.execute(query + " ORDER BY run_at", params).fetchall()
+
+    def create_scheduled_job(self, schedule: Schedule, next_run: Optional[float],
+                             excluded: Optional[Dict[Destination, str]] = None) -> Optional[int]:
+        """Create the job of a due schedule and move it to `next_run` (retire it if None)
+
+        Both happen in one transaction, so a crash cannot leave a started
+        job with its schedule still due. Returns None if the schedule was
+        dropped in the meantime.
+        """
+        with self.conn:
+            if next_run is None:
+                cursor = self.conn.execute(
+                    "UPDATE schedules SET status = 'done' WHERE schedule_id = ? AND status = 'active'",
+                    (schedule.schedule_id,)
+                )
+            else:
+                cursor = self.conn.execute(
+                    "UPDATE schedules SET run_at = ? WHERE schedule_id = ? AND status = 'active'",
+                    (next_run, schedule.schedule_id)
+                )
+            if not cursor.rowcount:
+                return None
+            return self._insert_job(
+                schedule.chat_id, schedule.messages, schedule.destinations, schedule.groups_info,
+                schedule.skip_duplicates, excluded
+            )
+
+    def finish_schedule(self, schedule_id: int, status: str = 'done', chat_id: Optional[int] = None) -> bool:
+        """Retire an active schedule, only one of `chat_id` when given"""
+        query = "UPDATE schedules SET status = ? WHERE schedule_id = ? AND status = 'active'"
+        params: Tuple = (status, schedule_id)
+        if chat_id is not None:
+            query += " AND chat_id = ?"
+            params += (chat_id,)
+        with self.conn:
+            return self.conn.execute(query, params).rowcount > 0
+
+    def sync_cursors(self, source_chat_id: int) -> Dict[Destination, int]:
+        """Last source message_id queued for each destination of a synced channel"""
+        rows = self.conn.execute(
+            "SELECT group_id, topic_id, message_id FROM sync_cursors WHERE source_chat_id = ?",
+            (source_chat_id,)
+        )
+        return {(group_id, topic_id or None): message_id for group_id, topic_id, message_id in rows}
+
+    def create_sync_job(self, source_chat_id: int, messages: List[MessageRecord], destinations: List[Destination],
+                        groups_info: Dict[int, Dict], message_id: int,
+                        excluded: Optional[Dict[Destination, str]] = None) -> int:
+        """Create a job for new channel posts and move the destinations' cursors to `message_id`
+
+        Both happen in one transaction, so posts delivered again after a
+        crash are either already in a job or not yet past a cursor. The
+        cursors stop re-sends, so the delivery index is not consulted.
+        """
+        with self.conn:
+            job_id = self._insert_job(
+                SYNC_CHAT_ID, messages, destinations, groups_info, skip_duplicates=False, excluded=excluded
+            )
+            self.conn.executemany(
+                "INSERT INTO sync_cursors (source_chat_id, group_id, topic_id, message_id, updated_at) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (source_chat_id, group_id, topic_id) DO UPDATE SET "
+                "message_id = MAX(message_id, excluded.message_id), updated_at = excluded.updated_at",
+                (
+                    (source_chat_id, group_id, topic_id or 0, message_id, time.time())
+                    for group_id, topic_id in destinations
+                )
+            )
+        return job_id
+
+    def store_sync_post(self, source_chat_id: int, message_id: int, record: MessageRecord) -> None:
+        """Keep a received channel post until it is queued, so a crash does not lose it"""
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO sync_posts (source_chat_id, message_id, payload) VALUES (?, ?, ?)",
+                (source_chat_id, message_id, record.to_json())
+            )
+
+    def stored_sync_posts(self, source_chat_id: int) -> List[Tuple[int, MessageRecord]]:
+        rows = self.conn.execute(
+            "SELECT message_id, payload FROM sync_posts WHERE source_chat_id = ? ORDER BY message_id",
+            (source_chat_id,)
+        )
+        return [(message_id, MessageRecord.from_json(payload)) for message_id, payload in rows]
+
+    def forget_sync_posts(self, source_chat_id: int, message_id: int) -> None:
+        """Drop stored posts up to `message_id` once they are queued"""
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM sync_posts WHERE source_chat_id = ? AND message_id <= ?", (source_chat_id, message_id)
+            )
+
+    def compact(self, delivered_ttl: float, job_retention: float) -> Tuple[int, int]:
+        """Expire old delivery index entries and drop finished jobs, then reclaim space
+
+        A zero TTL or retention keeps the respective rows forever. Space is
+        given back a bounded number of pages at a time rather than with a full
+        VACUUM, which would rewrite the whole file. Returns the number of
+        expired index entries and of removed jobs.
+        """
+        now = time.time()
+        expired = removed = 0
+        with self.conn:
+            if delivered_ttl > 0:
+                expired = self.conn.execute(
+                    "DELETE FROM delivered WHERE delivered_at < ?", (now - delivered_ttl,)
+                ).rowcount
+            if job_retention > 0:
+                job_ids = [
+                    (job_id,) for job_id, in self.conn.execute(
+                        "SELECT job_id FROM jobs WHERE status != 'running' AND created_at < ?",
+                        (now - job_retention,)
+                    )
+                ]
+                for table in ('deliveries', 'job_messages', 'jobs'):
+                    self.conn.executemany(f"DELETE FROM {table} WHERE job_id = ?", job_ids)
+                removed = len(job_ids)
+                self.conn.execute(
+                    "DELETE FROM schedules WHERE status != 'active' AND created_at < ?", (now - job_retention,)
+                )
+        # executescript steps the pragma to completion; execute frees one page
+        self.conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES});")
+        return expired, removed
@@ -0,0 +1,64 @@
+import asyncio
+import time
+from typing import Dict
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, cost: float = 1) -> None:
+        """Wait until `cost` tokens can be taken.
+
+        A cost larger than the capacity is allowed and leaves the bucket in
+        debt, so later callers wait for it to be paid back.
+        """
+        async with self.lock:
+            needed = min(cost, self.capacity)
+            while True:
+                self._refill()
+                if self.tokens >= needed:
+                    self.tokens -= cost
+                    return
+                await asyncio.sleep((needed - self.tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller for at least `seconds`"""
+        self._refill()
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class RateLimiter:
+    """Enforces Telegram's global per-bot rate and its per-chat rate"""
+
+    def __init__(self, global_rate: float, chat_rate_per_minute: float, chat_burst: int):
+        self.global_bucket = TokenBucket(global_rate, max(global_rate, 1))
+        self.chat_rate = chat_rate_per_minute / 60
+        self.chat_burst = max(chat_burst, 1)
+        self.chat_buckets: Dict[int, TokenBucket] = {}
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def acquire(self, chat_id: int, cost: int = 1) -> None:
+        """Wait for a slot in the chat's budget, then in the bot-wide budget"""
+        await self._chat_bucket(chat_id).acquire(cost)
+        await self.global_bucket.acquire(cost)
+
+    def pause_chat(self, chat_id: int, seconds: float) -> None:
+        """Park one chat, e.g. after Telegram answered with RetryAfter"""
+        self._chat_bucket(chat_id).pause(seconds)
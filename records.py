@@ -0,0 +1,95 @@
+import hashlib
+import json
+from typing import Optional, Sequence, Tuple
+
+from telegram import Message, MessageEntity
+
+
+class MessageRecord:
+    """The part of an incoming message needed to send it again.
+
+    Media is kept by file_id only, so no Telegram objects stay alive
+    for the lifetime of a batch and records serialize cheaply.
+    """
+
+    __slots__ = (
+        'type', 'file_id', 'file_unique_id', 'text', 'caption',
+        'entities', 'media_group_id', 'source_chat_id', 'source_message_id', 'position'
+    )
+
+    def __init__(self, type: str, file_id: Optional[str] = None, file_unique_id: Optional[str] = None,
+                 text: Optional[str] = None, caption: Optional[str] = None,
+                 entities: Optional[Sequence[MessageEntity]] = None, media_group_id: Optional[str] = None,
+                 source_chat_id: Optional[int] = None, source_message_id: Optional[int] = None,
+                 position: Optional[int] = None):
+        self.type = type
+        self.file_id = file_id
+        self.file_unique_id = file_unique_id
+        self.text = text
+        self.caption = caption
+        self.entities: Optional[Tuple[MessageEntity, ...]] = tuple(entities) if entities else None
+        self.media_group_id = media_group_id
+        # Message copied as is ('copy' records), e.g. from a manifest
+        self.source_chat_id = source_chat_id
+        self.source_message_id = source_message_id
+        # Index of the record inside its outbox job
+        self.position = position
+
+    @classmethod
+    def from_message(cls, message: Message) -> 'MessageRecord':
+        media = message.video or message.document or (message.photo[-1] if message.photo else None)
+        return cls(
+            type='video' if message.video else
+                 'document' if message.document else
+                 'photo' if message.photo else
+                 'text',
+            file_id=media.file_id if media else None,
+            file_unique_id=media.file_unique_id if media else None,
+            text=message.text,
+            caption=message.caption,
+            entities=message.entities or message.caption_entities,
+            media_group_id=message.media_group_id
+        )
+
+    @property
+    def content(self) -> Optional[str]:
+        """What to send: the file_id of media, the text otherwise"""
+        return self.file_id if self.file_id else self.text
+
+    @property
+    def bot_bound(self) -> bool:
+        """Only the bot that received the file, or can read the source chat, can send it"""
+        return bool(self.file_id or self.source_chat_id)
+
+    @property
+    def content_key(self) -> Optional[str]:
+        """Identity of the content for deduplication: the file, or a hash of the text"""
+        if self.source_chat_id:
+            return f"copy:{self.source_chat_id}:{self.source_message_id}"
+        if self.file_unique_id:
+            return f"file:{self.file_unique_id}"
+        if self.text:
+            return "text:" + hashlib.sha1(self.text.encode()).hexdigest()
+        return None
+
+    def to_json(self) -> str:
+        return json.dumps(
+            [
+                self.type, self.file_id, self.file_unique_id, self.text, self.caption,
+                [entity.to_dict() for entity in self.entities or ()], self.media_group_id,
+                self.source_chat_id, self.source_message_id
+            ],
+            separators=(',', ':'),
+            ensure_ascii=False
+        )
+
+    @classmethod
+    def from_json(cls, payload: str, position: Optional[int] = None) -> 'MessageRecord':
+        # Payloads written before copy records existed have no source fields
+        type, file_id, file_unique_id, text, caption, entities, media_group_id, *source = json.loads(payload)
+        source_chat_id, source_message_id = source or (None, None)
+        return cls(
+            type, file_id, file_unique_id, text, caption,
+            [MessageEntity.de_json(entity, None) for entity in entities],
+            media_group_id, source_chat_id, source_message_id, position
+        )
@@ -0,0 +1,50 @@
+import random
+from typing import Optional
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+# Error texts meaning the destination itself is unreachable, not just this message
+DEAD_DESTINATION_ERRORS = (
+    'chat not found',
+    'topic_closed',
+    'topic_deleted',
+    'message thread not found',
+    'not enough rights',
+    'have no rights',
+    'need administrator rights',
+    'chat_write_forbidden',
+    'chat_restricted'
+)
+
+
+def is_destination_error(error: Exception) -> bool:
+    """Whether sending anything else to the same destination would fail as well"""
+    if isinstance(error, Forbidden):
+        return True
+    return isinstance(error, BadRequest) and any(text in str(error).lower() for text in DEAD_DESTINATION_ERRORS)
+
+
+class RetryPolicy:
+    """Decides whether a failed send is retried and how long to wait first"""
+
+    def __init__(self, max_retries: int, base_delay: float, max_delay: float):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay_for(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retry number `attempt` (1-based), or None to give up"""
+        if attempt > self.max_retries:
+            return None
+
+        if isinstance(error, RetryAfter):
+            # Telegram tells us exactly how long to wait; jitter only spreads
+            # out the destinations that were throttled at the same moment
+            return error.retry_after + random.uniform(0, 1)
+
+        # BadRequest is a NetworkError subclass but retrying it never helps
+        if isinstance(error, NetworkError) and not isinstance(error, BadRequest):
+            backoff = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+            return random.uniform(backoff / 2, backoff)
+
+        return None
@@ -0,0 +1,174 @@
+import asyncio
+import heapq
+import logging
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Starts the job of a due schedule
+DispatchFunc = Callable[[int], Awaitable[None]]
+# Deliveries still pending in running jobs
+LoadFunc = Callable[[], int]
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+DURATION_PATTERN = re.compile(r'(\d+)\s*([smhdw])')
+
+
+def parse_duration(text: str) -> Optional[float]:
+    """Seconds in a duration like "90s", "2h", "1d12h"; None if it is not one"""
+    text = text.replace(' ', '').lower()
+    parts = DURATION_PATTERN.findall(text)
+    if not parts or ''.join(number + unit for number, unit in parts) != text:
+        return None
+    seconds = sum(int(number) * DURATION_UNITS[unit] for number, unit in parts)
+    return seconds or None
+
+
+def parse_when(text: str, now: Optional[float] = None) -> Tuple[float, Optional[float]]:
+    """Run time and repeat interval of a schedule in server local time.
+
+    Accepts "in 2h", "23:30" (its next occurrence), "2025-01-31 23:30", each
+    optionally followed by "every 1d". Raises ValueError for anything else.
+    """
+    now = time.time() if now is None else now
+    when, _, every = text.strip().lower().partition('every')
+    when = when.strip()
+    interval = None
+    if every.strip():
+        interval = parse_duration(every)
+        if interval is None:
+            raise ValueError(f"unknown interval {every.strip()!r}")
+    if not when:
+        if interval is None:
+            raise ValueError("no time given")
+        return now + interval, interval
+
+    if when.startswith('in '):
+        delay = parse_duration(when[3:])
+        if delay is None:
+            raise ValueError(f"unknown duration {when[3:].strip()!r}")
+        return now + delay, interval
+
+    current = datetime.fromtimestamp(now)
+    for fmt in ('%H:%M', '%Y-%m-%d %H:%M'):
+        try:
+            parsed = datetime.strptime(when, fmt)
+        except ValueError:
+            continue
+        if fmt == '%H:%M':
+            parsed = current.replace(hour=parsed.hour, minute=parsed.minute, second=0, microsecond=0)
+            if parsed <= current:
+                parsed += timedelta(days=1)
+        elif parsed <= current:
+            raise ValueError("that time has already passed")
+        return parsed.timestamp(), interval
+    raise ValueError(f"unknown time {when!r}")
+
+
+def next_occurrence(run_at: float, interval: Optional[float], now: float) -> Optional[float]:
+    """Next run of a schedule after `now`, skipping runs missed while down"""
+    if not interval:
+        return None
+    missed = max(int((now - run_at) // interval) + 1, 1)
+    return run_at + missed * interval
+
+
+def format_time(timestamp: float) -> str:
+    return time.strftime('%Y-%m-%d %H:%M', time.localtime(timestamp))
+
+
+class Scheduler:
+    """Timer queue of scheduled jobs with a load-aware dispatcher.
+
+    Due times live in a heap woken by a single task; the schedules
+    themselves are persisted by the caller, so the heap is simply rebuilt
+    with `add` after a restart. Removed or moved entries are left in the
+    heap and skipped when they come up.
+
+    Jobs of at least `large_job` deliveries are staggered: each starts once
+    the send budget is expected to be free again, estimated from the
+    deliveries still pending in running jobs and from the jobs this
+    scheduler started, at `rate` messages per second. No job is held back
+    more than `max_delay` seconds past its due time.
+    """
+
+    def __init__(self, load: LoadFunc, rate: float, large_job: int, max_delay: float):
+        self.dispatch: Optional[DispatchFunc] = None
+        self.load = load
+        self.rate = max(rate, 0.1)
+        self.large_job = large_job
+        self.max_delay = max_delay
+        # (start at, schedule id, due at); due at is when it was scheduled for
+        self.heap: List[Tuple[float, int, float]] = []
+        # Schedule id -> (start at, deliveries) of its live heap entry
+        self.entries: Dict[int, Tuple[float, int]] = {}
+        self.busy_until = 0.0
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def add(self, schedule_id: int, run_at: float, size: int) -> None:
+        """Queue a schedule, replacing an earlier entry for it"""
+        self._push(schedule_id, run_at, run_at, size)
+
+    def remove(self, schedule_id: int) -> None:
+        self.entries.pop(schedule_id, None)
+
+    def _push(self, schedule_id: int, start_at: float, due_at: float, size: int) -> None:
+        self.entries[schedule_id] = (start_at, size)
+        heapq.heappush(self.heap, (start_at, schedule_id, due_at))
+        # The new entry may come before the one the timer is sleeping for
+        self.wakeup.set()
+
+    def start(self, dispatch: DispatchFunc) -> asyncio.Task:
+        """Start dispatching due schedules with `dispatch`"""
+        self.dispatch = dispatch
+        self.task = asyncio.create_task(self.run())
+        return self.task
+
+    def start_time(self, size: int, due_at: float, now: float) -> float:
+        """When a job of `size` deliveries due at `due_at` should start"""
+        if size < self.large_job:
+            return now
+        busy_until = max(self.busy_until, now + self.load() / self.rate)
+        return min(busy_until, due_at + self.max_delay)
+
+    async def run(self) -> None:
+        while True:
+            self.wakeup.clear()
+            # Drop entries of removed or moved schedules
+            while self.heap and self.entries.get(self.heap[0][1], (None,))[0] != self.heap[0][0]:
+                heapq.heappop(self.heap)
+            if not self.heap:
+                await self.wakeup.wait()
+                continue
+
+            start_at, schedule_id, due_at = self.heap[0]
+            now = time.time()
+            if start_at > now:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), start_at - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self.heap)
+            _, size = self.entries.pop(schedule_id)
+            begin_at = self.start_time(size, due_at, now)
+            if begin_at > now:
+                if start_at == due_at:
+                    logger.info(
+                        f"Holding back scheduled job {schedule_id} ({size} deliveries) "
+                        f"until the send budget frees up, about {begin_at - now:.0f}s"
+                    )
+                # The estimate is rough, look again at least a second later
+                self._push(schedule_id, max(begin_at, now + 1), due_at, size)
+                continue
+
+            self.busy_until = max(self.busy_until, now) + size / self.rate
+            try:
+                await self.dispatch(schedule_id)
+            except Exception as e:
+                logger.error(f"Starting scheduled job {schedule_id} failed: {e}")
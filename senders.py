@@ -0,0 +1,75 @@
+import time
+from typing import Dict, List, Sequence
+
+from ratelimit import RateLimiter
+from records import MessageRecord
+
+# Seconds an extra token that may not post to a chat is left out there, in
+# case it is added to the chat meanwhile
+FORBIDDEN_RECHECK = 3600
+
+
+class Sender:
+    """One bot token with its own rate budget and connection pool"""
+
+    def __init__(self, bot, limiter: RateLimiter, name: str):
+        self.bot = bot
+        self.limiter = limiter
+        self.name = name
+        # Chat id -> monotonic time until which Telegram flood-limited this token there
+        self.flooded_until: Dict[int, float] = {}
+        # Chat id -> monotonic time until which this token is not used there
+        self.forbidden_until: Dict[int, float] = {}
+
+    def is_flooded(self, chat_id: int) -> bool:
+        return self.flooded_until.get(chat_id, 0) > time.monotonic()
+
+    def is_forbidden(self, chat_id: int) -> bool:
+        return self.forbidden_until.get(chat_id, 0) > time.monotonic()
+
+
+class SenderPool:
+    """The primary bot plus optional extra sender bots.
+
+    Each chat is assigned to one token so its rate budget is tracked in one
+    place. When that token is flood-limited in a chat, other tokens take
+    over until it recovers. Telegram file_ids only work for the bot that
+    received the file, so units carrying media (or copies of messages only
+    the primary bot can read) always go through the primary bot; the extra
+    tokens carry text. An extra token that may not post to a chat (e.g. it
+    is not a member) is left out there and the others take over.
+    """
+
+    def __init__(self, primary: Sender, extra: Sequence[Sender] = ()):
+        self.senders: List[Sender] = [primary, *extra]
+
+    @property
+    def primary(self) -> Sender:
+        return self.senders[0]
+
+    def assigned(self, chat_id: int) -> Sender:
+        return self.senders[chat_id % len(self.senders)]
+
+    def pick(self, chat_id: int, unit: List[MessageRecord]) -> Sender:
+        """Token to send `unit` to `chat_id` with"""
+        if any(msg.bot_bound for msg in unit):
+            return self.primary
+        # The primary is never left out, so there always is a candidate
+        candidates = [other for other in self.senders if not other.is_forbidden(chat_id)]
+        sender = self.assigned(chat_id)
+        if sender in candidates and not sender.is_flooded(chat_id):
+            return sender
+        available = [other for other in candidates if not other.is_flooded(chat_id)]
+        if available:
+            return available[0]
+        # Everyone is flooded here: wait for whoever recovers first
+        return min(candidates, key=lambda other: other.flooded_until.get(chat_id, 0))
+
+    def report_flood(self, sender: Sender, chat_id: int, seconds: float) -> None:
+        sender.flooded_until[chat_id] = time.monotonic() + seconds
+        sender.limiter.pause_chat(chat_id, seconds)
+
+    def report_forbidden(self, sender: Sender, chat_id: int) -> None:
+        """Stop using an extra token in a chat it may not post to"""
+        if sender is not self.primary:
+            sender.forbidden_until[chat_id] = time.monotonic() + FORBIDDEN_RECHECK
@@ -0,0 +1,85 @@
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from ingest import IngestBuffer
+from keyboards import SelectionMenu
+from records import MessageRecord
+
+
+class Session:
+    """Collection and destination-selection state of one operator"""
+
+    __slots__ = (
+        'user_id', 'last_used', 'received_items', 'collecting', 'selected_groups',
+        'selected_topics', 'messages_to_forward', 'message_ids', 'ingest', 'receipt_message_id',
+        'groups_info', 'group_menu', 'topic_menus', 'topic_groups', 'topic_group_index', 'search_target',
+        'skip_duplicates', 'schedule'
+    )
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.last_used = time.monotonic()
+        self.ingest: Optional[IngestBuffer] = None
+        self.reset()
+
+    def reset(self) -> None:
+        if self.ingest:
+            self.ingest.cancel()
+        self.received_items = {
+            'videos': 0,
+            'files': 0,
+            'texts': 0,
+            'others': 0
+        }
+        self.collecting = False
+        self.selected_groups: Set[int] = set()
+        self.selected_topics: Dict[int, Set[int]] = {}
+        self.messages_to_forward: List[MessageRecord] = []
+        # Telegram message ids of messages_to_forward, kept sorted alongside it
+        self.message_ids: List[int] = []
+        self.ingest = None
+        # Live "received N items" message while collecting
+        self.receipt_message_id: Optional[int] = None
+        self.groups_info: Dict[int, Dict] = {}
+        self.group_menu: Optional[SelectionMenu] = None
+        self.topic_menus: Dict[int, SelectionMenu] = {}
+        self.topic_groups: List[int] = []
+        self.topic_group_index: Dict[int, int] = {}
+        # Menu waiting for a search text ("groups" or "topics:<group_id>")
+        self.search_target: Optional[str] = None
+        # Per-job override of Config.SKIP_DUPLICATES, None keeps the default
+        self.skip_duplicates: Optional[bool] = None
+        # Run time and repeat interval set by /schedule; None forwards right away
+        self.schedule: Optional[Tuple[float, Optional[float]]] = None
+
+
+class SessionManager:
+    """Per-user sessions, evicted when idle for `ttl` seconds or least recently used"""
+
+    def __init__(self, max_sessions: int, ttl: float):
+        self.max_sessions = max(max_sessions, 1)
+        self.ttl = ttl
+        self.sessions: "OrderedDict[int, Session]" = OrderedDict()
+
+    def get(self, user_id: int) -> Session:
+        now = time.monotonic()
+        self._evict_idle(now)
+
+        session = self.sessions.get(user_id)
+        if session is None:
+            session = self.sessions[user_id] = Session(user_id)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        else:
+            self.sessions.move_to_end(user_id)
+        session.last_used = now
+        return session
+
+    def _evict_idle(self, now: float) -> None:
+        # Least recently used sessions come first, so stop at the first fresh one
+        while self.sessions:
+            session = next(iter(self.sessions.values()))
+            if now - session.last_used < self.ttl:
+                break
+            self.sessions.popitem(last=False)
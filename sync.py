@@ -0,0 +1,69 @@
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fanout import Destination
+from ingest import IngestBuffer, IngestedItem
+from outbox import Outbox
+from records import MessageRecord
+
+logger = logging.getLogger(__name__)
+
+# Queues a job delivering the records to the destinations, moving their
+# cursors to the given message_id with Outbox.create_sync_job
+StartJobFunc = Callable[[List[MessageRecord], List[Destination], int], Awaitable[None]]
+
+
+class ChannelSync:
+    """Mirrors new posts of a source channel to a fixed set of destinations.
+
+    Posts are buffered like received messages, so posts arriving close
+    together (and the parts of an album) become one forwarding job. Every
+    destination has a cursor in the outbox, the last source message_id
+    queued for it. Only posts past the cursor are queued, so updates that
+    Telegram delivers again after a restart are not sent twice. The Bot
+    API cannot read channel history, so nothing is ever rescanned: a
+    destination added later gets the posts that arrive from then on.
+
+    Buffered posts are also stored in the outbox until they are queued, as
+    Telegram will not deliver them again once they were received.
+    """
+
+    def __init__(self, outbox: Outbox, source_chat_id: int, destinations: List[Destination],
+                 debounce: float, max_wait: float):
+        self.outbox = outbox
+        self.source_chat_id = source_chat_id
+        self.destinations = destinations
+        self.buffer = IngestBuffer(self._flush, debounce, max_wait)
+        self.start_job: Optional[StartJobFunc] = None
+
+    def start(self, start_job: StartJobFunc) -> None:
+        """Start syncing, handing each batch of new posts to `start_job`"""
+        self.start_job = start_job
+        # Posts received before a crash that never made it into a job
+        for message_id, record in self.outbox.stored_sync_posts(self.source_chat_id):
+            self.buffer.add(message_id, record, 'posts')
+
+    def add(self, message_id: int, record: MessageRecord) -> None:
+        self.outbox.store_sync_post(self.source_chat_id, message_id, record)
+        self.buffer.add(message_id, record, 'posts')
+
+    async def flush(self) -> None:
+        """Queue the buffered posts now, e.g. before shutting down"""
+        await self.buffer.flush()
+
+    async def _flush(self, items: List[IngestedItem], counts: Dict[str, int]) -> None:
+        cursors = self.outbox.sync_cursors(self.source_chat_id)
+        # Destinations usually share their cursor and so the same batch
+        batches: Dict[Tuple[int, ...], List[Destination]] = {}
+        for destination in self.destinations:
+            cursor = cursors.get(destination, 0)
+            positions = tuple(index for index, (message_id, _) in enumerate(items) if message_id > cursor)
+            if positions:
+                batches.setdefault(positions, []).append(destination)
+
+        for positions, destinations in batches.items():
+            records = [items[index][1] for index in positions]
+            await self.start_job(records, destinations, items[positions[-1]][0])
+            logger.info(f"🔁 Synced {len(records)} new posts to {len(destinations)} destinations")
+        # Every destination's cursor is past these posts now
+        self.outbox.forget_sync_posts(self.source_chat_id, items[-1][0])
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import time
+from typing import Optional, Tuple
+
+import httpx
+from telegram.error import TimedOut
+from telegram.request import HTTPXRequest, RequestData
+
+logger = logging.getLogger(__name__)
+
+
+class PooledRequest(HTTPXRequest):
+    """HTTPXRequest with keep-alive control that reports connection pool saturation.
+
+    Requests take a slot of a semaphore sized like the connection pool
+    before reaching httpx, so the time spent waiting for a free connection
+    can be measured. Every `report_interval` seconds in which requests had to
+    wait, a summary is logged.
+    """
+
+    __slots__ = ('name', 'pool_size', 'slots', 'report_interval', 'requests', 'waited', 'wait_time',
+                 'max_wait', 'reported_at')
+
+    def __init__(self, name: str, pool_size: int, keepalive_expiry: float = 60.0,
+                 connect_timeout: float = 5.0, read_timeout: float = 10.0, write_timeout: float = 20.0,
+                 pool_timeout: float = 10.0, http_version: str = "1.1", report_interval: float = 30.0):
+        super().__init__(
+            connection_pool_size=pool_size,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            write_timeout=write_timeout,
+            pool_timeout=pool_timeout,
+            http_version=http_version
+        )
+        self._client_kwargs['limits'] = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._client = self._build_client()
+
+        self.name = name
+        self.pool_size = pool_size
+        self.slots = asyncio.Semaphore(pool_size)
+        self.report_interval = report_interval
+        self.requests = 0
+        self.waited = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.reported_at = time.monotonic()
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         *args, **kwargs) -> Tuple[int, bytes]:
+        # Only our own pool timeout applies, httpx always finds a free connection
+        pool_timeout = kwargs.pop('pool_timeout', None)
+        if not isinstance(pool_timeout, (int, float)):
+            pool_timeout = self._client.timeout.pool
+
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.slots.acquire(), pool_timeout)
+        except asyncio.TimeoutError:
+            self._record_wait(time.perf_counter() - started)
+            raise TimedOut(
+                f"Pool timeout: all {self.pool_size} connections of the {self.name} pool are busy"
+            ) from None
+        self._record_wait(time.perf_counter() - started)
+
+        try:
+            return await super().do_request(url, method, request_data, *args, **kwargs)
+        finally:
+            self.slots.release()
+
+    def _record_wait(self, waited: float) -> None:
+        self.requests += 1
+        # Anything beyond scheduling noise means the pool was full
+        if waited > 0.001:
+            self.waited += 1
+            self.wait_time += waited
+            self.max_wait = max(self.max_wait, waited)
+
+        now = time.monotonic()
+        if now - self.reported_at < self.report_interval:
+            return
+        if self.waited:
+            logger.warning(
+                f"HTTP pool '{self.name}' saturated: {self.waited}/{self.requests} requests waited "
+                f"for one of {self.pool_size} connections, avg {self.wait_time / self.waited * 1000:.0f} ms, "
+                f"max {self.max_wait * 1000:.0f} ms"
+            )
+        self.requests = self.waited = 0
+        self.wait_time = self.max_wait = 0.0
+        self.reported_at = now
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+from pathlib import Path
+from typing import List, Optional
+
+from telegram.error import RetryAfter
+
+from ratelimit import RateLimiter
+from records import MessageRecord
+from retry import RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+PHOTO_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+VIDEO_EXTENSIONS = {'.mp4', '.mov', '.m4v'}
+
+# Bot API upload limits; bigger photos are sent as documents
+MAX_UPLOAD_SIZE = 50 * 1024 * 1024
+MAX_PHOTO_SIZE = 10 * 1024 * 1024
+
+
+def list_files(directory: Path) -> List[Path]:
+    """Regular, non-hidden files of a directory in name order"""
+    return sorted(
+        path for path in directory.iterdir()
+        if path.is_file() and not path.name.startswith('.')
+    )
+
+
+def media_type(path: Path, size: int) -> str:
+    suffix = path.suffix.lower()
+    if suffix in PHOTO_EXTENSIONS and size <= MAX_PHOTO_SIZE:
+        return 'photo'
+    if suffix in VIDEO_EXTENSIONS:
+        return 'video'
+    return 'document'
+
+
+class UploadResult:
+    def __init__(self, path: Path, record: Optional[MessageRecord] = None, reused: bool = False,
+                 error: Optional[str] = None):
+        self.path = path
+        self.record = record
+        self.reused = reused
+        self.error = error
+
+
+class Uploader:
+    """Uploads local files once to a staging chat and keeps their file_ids.
+
+    The records it returns are the same ones handle_message produces, so
+    every destination is then sent the file by file_id. Uploads already
+    done for an unchanged file are taken from `cache` (the outbox).
+    Files are read in worker threads and at most `concurrency` are in
+    memory and in flight at once.
+    """
+
+    def __init__(self, bot, staging_chat_id: int, limiter: RateLimiter, retry_policy: RetryPolicy,
+                 concurrency: int, cache, write_timeout: float = 120.0):
+        self.bot = bot
+        self.staging_chat_id = staging_chat_id
+        self.limiter = limiter
+        self.retry_policy = retry_policy
+        self.semaphore = asyncio.Semaphore(max(concurrency, 1))
+        self.cache = cache
+        self.write_timeout = write_timeout
+
+    async def upload_all(self, paths: List[Path]) -> List[UploadResult]:
+        """Upload files concurrently, results in `paths` order"""
+        return await asyncio.gather(*(self.upload(path) for path in paths))
+
+    async def upload(self, path: Path) -> UploadResult:
+        try:
+            stat = path.stat()
+        except OSError as e:
+            return UploadResult(path, error=str(e))
+
+        cached = self.cache.cached_upload(str(path), stat.st_size, stat.st_mtime)
+        if cached is not None:
+            return UploadResult(path, cached, reused=True)
+        if stat.st_size > MAX_UPLOAD_SIZE:
+            return UploadResult(path, error="larger than the 50 MB Bot API upload limit")
+
+        kind = media_type(path, stat.st_size)
+        async with self.semaphore:
+            try:
+                # PTB buffers the whole body anyway, so read it in one go off the event loop
+                data = await asyncio.to_thread(path.read_bytes)
+                message = await self._send(kind, path.name, data)
+            except Exception as e:
+                logger.error(f"Uploading {path} failed: {e}")
+                return UploadResult(path, error=str(e))
+
+        record = MessageRecord.from_message(message)
+        self.cache.store_upload(str(path), stat.st_size, stat.st_mtime, record)
+        return UploadResult(path, record)
+
+    async def _send(self, kind: str, filename: str, data: bytes):
+        attempt = 0
+        while True:
+            await self.limiter.acquire(self.staging_chat_id)
+            try:
+                return await getattr(self.bot, f"send_{kind}")(
+                    chat_id=self.staging_chat_id,
+                    filename=filename,
+                    disable_notification=True,
+                    write_timeout=self.write_timeout,
+                    **{kind: data}
+                )
+            except Exception as e:
+                attempt += 1
+                delay = self.retry_policy.delay_for(e, attempt)
+                if delay is None:
+                    raise
+                if isinstance(e, RetryAfter):
+                    self.limiter.pause_chat(self.staging_chat_id, delay)
+                logger.warning(f"Retrying upload of {filename} in {delay:.1f}s (attempt {attempt}): {e}")
+                await asyncio.sleep(delay)
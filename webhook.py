@@ -0,0 +1,164 @@
+import asyncio
+import hmac
+import json
+import logging
+import signal
+import ssl
+from pathlib import Path
+from typing import Optional, Set
+
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+# Telegram updates are small; anything bigger is not from Telegram
+MAX_BODY_SIZE = 1024 * 1024
+
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+
+# Seconds a kept-alive connection may sit idle before it is closed
+IDLE_TIMEOUT = 60
+
+
+class WebhookServer:
+    """Minimal asyncio HTTP server feeding webhook updates into the application.
+
+    Only POSTs to `path` carrying the right secret token are accepted; the
+    token is required, as anyone reaching the server could post updates. Each
+    update is queued and answered right away; the application processes
+    them concurrently according to its `concurrent_updates` setting.
+    """
+
+    def __init__(self, application: Application, path: str, secret_token: str):
+        self.application = application
+        self.path = '/' + path.lstrip('/')
+        self.secret_token = secret_token
+        self.server: Optional[asyncio.AbstractServer] = None
+        # Open client connections, closed on stop so wait_closed does not wait for them
+        self.writers: Set[asyncio.StreamWriter] = set()
+
+    async def start(self, host: str, port: int, ssl_context: Optional[ssl.SSLContext] = None) -> None:
+        self.server = await asyncio.start_server(self._handle, host, port, ssl=ssl_context)
+        logger.info(f"🌐 Webhook server listening on {host}:{port}{self.path}")
+
+    async def stop(self) -> None:
+        if self.server:
+            self.server.close()
+            for writer in list(self.writers):
+                writer.close()
+            await self.server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.writers.add(writer)
+        try:
+            # Telegram keeps connections alive, so serve requests until it closes
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode('latin-1').strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                parts = request_line.decode('latin-1').split()
+                length = int(headers.get('content-length') or 0)
+                if length > MAX_BODY_SIZE:
+                    await self._respond(writer, "413 Payload Too Large")
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status = await self._process(parts, headers, body)
+                await self._respond(writer, status)
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    async def _process(self, parts: list, headers: dict, body: bytes) -> str:
+        if len(parts) < 2 or parts[1].split('?')[0] != self.path:
+            return "404 Not Found"
+        if parts[0] != 'POST':
+            return "405 Method Not Allowed"
+        if not hmac.compare_digest(
+            headers.get(SECRET_HEADER, '').encode(), self.secret_token.encode()
+        ):
+            logger.warning("Rejected webhook request with an invalid secret token")
+            return "403 Forbidden"
+
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Rejected malformed webhook update: {e}")
+            return "400 Bad Request"
+
+        await self.application.update_queue.put(update)
+        return "200 OK"
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: str) -> None:
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\n\r\n".encode())
+        await writer.drain()
+
+
+async def run_webhook(application: Application, listen: str, port: int, path: str, webhook_url: str,
+                      secret_token: str, cert: Optional[str] = None, key: Optional[str] = None,
+                      max_connections: int = 40) -> None:
+    """Serve the application over a webhook until SIGINT/SIGTERM.
+
+    Follows the same lifecycle as Application.run_polling, including the
+    post_init, post_stop and post_shutdown hooks. Without cert/key the server
+    speaks plain HTTP, for use behind a TLS-terminating reverse proxy.
+    """
+    ssl_context = None
+    if cert and key:
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(cert, key)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            # Not supported on Windows; KeyboardInterrupt still stops asyncio.run
+            pass
+
+    server = WebhookServer(application, path, secret_token)
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+
+        await application.start()
+        await server.start(listen, port, ssl_context)
+        await application.bot.set_webhook(
+            url=webhook_url,
+            certificate=Path(cert).read_bytes() if cert and ssl_context else None,
+            secret_token=secret_token,
+            max_connections=max_connections,
+            allowed_updates=Update.ALL_TYPES
+        )
+        logger.info(f"🤖 Bot is running with webhook {webhook_url}")
+
+        await stop_event.wait()
+        logger.info("Stopping webhook server...")
+    finally:
+        await server.stop()
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)